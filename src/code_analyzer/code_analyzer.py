@@ -1,11 +1,25 @@
 import json
 import logging
 import os
+import shutil
+import tempfile
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 
 from src.llm.llm_client import OllamaClient
 
+try:
+    # Необязательная зависимость: ускоряет чтение и запись кэша результатов
+    import orjson
+except ImportError:
+    orjson = None
+
+# Шаблонные строки-заглушки, которые модель иногда копирует из промпта
+_PLACEHOLDER_MARKERS = ("[краткое описание", "[brief description")
+
+# Размер буфера при записи итоговой документации (1 МБ)
+_OUTPUT_BUFFER_SIZE = 1 << 20
+
 
 class CodeAnalyzer:
     """Анализатор кода для документирования файлов и проектов."""
@@ -27,6 +41,9 @@ class CodeAnalyzer:
         }
         self.cache_dir = cache_dir
         self.analysis_results = {}
+        # Индекс файлов в папке output (имя файла -> путь), строится при первом обращении
+        self._output_index_root = None
+        self._output_index = {}
         # Создаем директории для кэша если их нет
         os.makedirs(os.path.join(cache_dir, 'docs'), exist_ok=True)
         os.makedirs(os.path.join(cache_dir, 'test_results'), exist_ok=True)
@@ -50,12 +67,13 @@ class CodeAnalyzer:
         path_obj = Path(path)
         results = {}
 
-        # Сначала подсчитываем общее количество файлов для анализа
-        total_files = 0
+        # Сначала собираем файлы для анализа, чтобы не обходить директорию дважды
+        files_to_process = []
         if path_obj.is_file():
-            total_files = 1
+            files_to_process = [path_obj]
         elif path_obj.is_dir():
-            total_files = len(self.find_files(path_obj, recursive))
+            files_to_process = self.find_files(path_obj, recursive)
+        total_files = len(files_to_process)
 
         logging.info("\n=== НАЧАЛО АНАЛИЗА ===")
         logging.info(f"Путь для анализа: {path}")
@@ -88,7 +106,7 @@ class CodeAnalyzer:
             success_count = 0
             error_count = 0
 
-            for file_path in self.find_files(path_obj, recursive):
+            for file_path in files_to_process:
                 processed_files += 1
 
                 try:
@@ -164,71 +182,74 @@ class CodeAnalyzer:
         # Создаем директорию для выходного файла, если её нет
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-        # Формируем содержимое документации
-        output_content = "# Документация проекта\n\n"
-
-        # Добавляем информацию о проанализированных файлах
-        output_content += "## Проанализированные файлы\n\n"
-
         # Группируем файлы по директориям
         files_by_dirs = {}
         for file_path, result in self.analysis_results.items():
-            abs_path = os.path.abspath(file_path)
-            dir_path = os.path.dirname(abs_path)
-
-            if dir_path not in files_by_dirs:
-                files_by_dirs[dir_path] = []
-
-            file_name = os.path.basename(file_path)
-            status = result.get('status', 'error')
-            status_icon = "✅" if status == 'success' else "❌"
-
-            files_by_dirs[dir_path].append((file_name, status_icon, file_path, result))
-
-        # Выводим файлы сгруппированные по директориям
-        for dir_path, files in files_by_dirs.items():
-            # Получаем относительный путь директории для отображения
-            try:
-                rel_dir = os.path.relpath(dir_path, os.getcwd())
-            except ValueError:
-                rel_dir = dir_path
-
-            output_content += f"### Директория: {rel_dir}\n\n"
-
-            for file_name, status_icon, full_path, _ in files:
-                output_content += f"- {status_icon} {file_name}\n"
+            dir_path = os.path.dirname(os.path.abspath(file_path))
+            files_by_dirs.setdefault(dir_path, []).append((file_path, result))
+
+        # Список файлов пишем сразу в выходной файл, а документацию классов - во временный
+        # буфер, который при большом объеме сбрасывается на диск
+        with open(output_file, 'w', encoding='utf-8', buffering=_OUTPUT_BUFFER_SIZE) as f, \
+                tempfile.SpooledTemporaryFile(max_size=_OUTPUT_BUFFER_SIZE, mode='w+',
+                                              encoding='utf-8') as docs_section:
+            f.write("# Документация проекта\n\n")
+            f.write("## Проанализированные файлы\n\n")
+
+            for dir_path, files in files_by_dirs.items():
+                # Получаем относительный путь директории для отображения
+                try:
+                    rel_dir = os.path.relpath(dir_path, os.getcwd())
+                except ValueError:
+                    rel_dir = dir_path
 
-            output_content += "\n"
+                dir_header = f"### Директория: {rel_dir}\n\n"
+                f.write(dir_header)
+                docs_section.write(dir_header)
 
-        output_content += "## Документация классов\n\n"
+                for file_path, result in files:
+                    file_name = os.path.basename(file_path)
+                    is_success = result.get('status', 'error') == 'success'
+                    status_icon = "✅" if is_success else "❌"
+                    f.write(f"- {status_icon} {file_name}\n")
 
-        # Добавляем документацию для каждого файла, сгруппированную по директориям
-        for dir_path, files in files_by_dirs.items():
-            try:
-                rel_dir = os.path.relpath(dir_path, os.getcwd())
-            except ValueError:
-                rel_dir = dir_path
+                    if is_success and 'documentation' in result:
+                        docs_section.write(f"#### {file_name}\n\n")
+                        docs_section.write("```kotlin\n")
+                        docs_section.write(result['documentation'])
+                        docs_section.write("\n```\n\n")
 
-            output_content += f"### Директория: {rel_dir}\n\n"
+                f.write("\n")
 
-            for file_name, _, full_path, result in files:
-                if result.get('status') == 'success' and 'documentation' in result:
-                    output_content += f"#### {file_name}\n\n"
-                    output_content += "```kotlin\n"
-                    output_content += result['documentation']
-                    output_content += "\n```\n\n"
-
-        # Сохраняем документацию в файл
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(output_content)
+            f.write("## Документация классов\n\n")
+            docs_section.seek(0)
+            shutil.copyfileobj(docs_section, f)
 
         logging.info(f"Документация успешно сгенерирована: {output_file}")
 
     def find_file_in_output_dir(self, name: str) -> Optional[str]:
-        for root, _, files in os.walk(os.path.abspath("output")):
-            if name in files:
-                return os.path.join(root, name)
-        return None
+        output_root = os.path.abspath("output")
+
+        # Обходим папку output один раз и дальше ищем файлы по индексу
+        rebuilt = self._output_index_root != output_root
+        if rebuilt:
+            self._build_output_index(output_root)
+
+        path = self._output_index.get(name)
+        if not rebuilt and (path is None or not os.path.exists(path)):
+            # Файл создан, удален или переименован после построения индекса:
+            # обходим папку заново
+            self._build_output_index(output_root)
+            path = self._output_index.get(name)
+        return path
+
+    def _build_output_index(self, output_root: str):
+        """Строит индекс 'имя файла -> путь' по папке с результатами."""
+        self._output_index = {}
+        for root, _, files in os.walk(output_root):
+            for file_name in files:
+                self._output_index.setdefault(file_name, os.path.join(root, file_name))
+        self._output_index_root = output_root
 
     def analyze_file(self, file_path: str, context_files: List[str] = None) -> Optional[Dict]:
         """
@@ -339,18 +360,36 @@ class CodeAnalyzer:
         Returns:
             Список путей к найденным файлам
         """
-        result = []
-
-        if recursive:
-            # Рекурсивный поиск
-            for ext in self.supported_extensions:
-                result.extend(path.glob(f"**/*{ext}"))
-        else:
-            # Только в текущей директории
-            for ext in self.supported_extensions:
-                result.extend(path.glob(f"*{ext}"))
+        # Обходим дерево один раз вместо отдельного glob на каждое расширение.
+        # Порядок результата совпадает с прежним: сначала все файлы первого
+        # расширения, затем второго и т.д., внутри группы - в порядке обхода glob
+        found = {ext: [] for ext in self.supported_extensions}
 
-        return result
+        def scan(current_dir: str):
+            try:
+                with os.scandir(current_dir) as it:
+                    entries = list(it)
+            except OSError as e:
+                logging.warning(f"Не удалось прочитать директорию {current_dir}: {str(e)}")
+                return
+
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    for ext, files in found.items():
+                        if entry.name.endswith(ext):
+                            files.append(Path(entry.path))
+                            break
+
+            # Во вложенные директории спускаемся только при рекурсивном поиске
+            if recursive:
+                for subdir in subdirs:
+                    scan(subdir)
+
+        scan(str(path))
+        return [file for files in found.values() for file in files]
 
     def _get_context(self, context_files: List[str]) -> Dict[str, str]:
         """
@@ -415,6 +454,15 @@ class CodeAnalyzer:
         original_doc = documentation
         documentation = documentation.strip()
 
+        # Быстрый путь: модель вернула чистый KDoc-блок, дальнейшие проверки не нужны
+        doc_lower = documentation.lower()
+        if (documentation.startswith("/**") and documentation.endswith("*/")
+                and "```" not in documentation
+                and not any(marker in doc_lower for marker in _PLACEHOLDER_MARKERS)):
+            logging.info(
+                f"Документация уже в формате KDoc, валидация завершена, размер: {len(documentation)}")
+            return documentation
+
         # Проверяем наличие тройных кавычек в начале документации
         starts_with_backticks = documentation.startswith("```")
         if starts_with_backticks:
@@ -447,22 +495,21 @@ class CodeAnalyzer:
             logging.info("Обнаружены тройные кавычки внутри документации")
 
             # Удаляем все оставшиеся блоки с кавычками
-            while "```" in documentation:
-                start_pos = documentation.find("```")
-                if start_pos == -1:
+            while True:
+                head, sep, rest = documentation.partition("```")
+                if not sep:
                     break
 
                 # Ищем закрывающие кавычки
-                end_pos = documentation.find("```", start_pos + 3)
-                if end_pos == -1:
+                content_between, closing, tail = rest.partition("```")
+                if not closing:
                     # Если нет закрывающих, удаляем только открывающие
-                    documentation = documentation[:start_pos] + documentation[start_pos + 3:]
+                    documentation = head + rest
                     logging.info("Удалены незакрытые тройные кавычки")
                 else:
                     # Удаляем кавычки, но сохраняем содержимое между ними
-                    content_between = documentation[start_pos + 3:end_pos].strip()
-                    documentation = documentation[:start_pos] + content_between + documentation[
-                                                                                  end_pos + 3:]
+                    content_between = content_between.strip()
+                    documentation = head + content_between + tail
                     logging.info(
                         f"Удален блок тройных кавычек, сохранено содержимое ({len(content_between)} символов)")
 
@@ -528,21 +575,20 @@ class CodeAnalyzer:
                 logging.info(f"Добавлен закрывающий маркер */, новый размер: {len(documentation)}")
 
         # Удаляем строки с "[Краткое описание]"
-        lines = documentation.split('\n')
-        filtered_lines = []
         removed_count = 0
 
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            # Проверяем различные варианты [Краткое описание]
-            if ("[краткое описание" in line_lower or
-                    "* [краткое описание" in line_lower or
-                    "[brief description" in line_lower or
-                    "* [brief description" in line_lower):
-                removed_count += 1
-                logging.info(f"Удалена строка #{i + 1}: '{line.strip()}'")
-                continue
-            filtered_lines.append(line)
+        # Построчно проверяем только если заглушка есть во всем тексте
+        doc_lower = documentation.lower()
+        if any(marker in doc_lower for marker in _PLACEHOLDER_MARKERS):
+            filtered_lines = []
+
+            for i, line in enumerate(documentation.split('\n')):
+                line_lower = line.lower()
+                if any(marker in line_lower for marker in _PLACEHOLDER_MARKERS):
+                    removed_count += 1
+                    logging.info(f"Удалена строка #{i + 1}: '{line.strip()}'")
+                    continue
+                filtered_lines.append(line)
 
         if removed_count > 0:
             documentation = '\n'.join(filtered_lines)
@@ -737,6 +783,11 @@ class CodeAnalyzer:
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(content_to_save)
 
+            # Поддерживаем индекс папки output в актуальном состоянии
+            if self._output_index_root and \
+                    output_file.startswith(self._output_index_root + os.path.sep):
+                self._output_index.setdefault(file_name, output_file)
+
             logging.info(f"Результат успешно сохранен в файл: {output_file}")
             logging.info(f"Размер сохраненного файла: {len(content_to_save)} символов")
 
@@ -745,7 +796,7 @@ class CodeAnalyzer:
 
     def _get_cache_path(self, file_path: str, file_type: str) -> str:
         """
-        Генерирует путь к кэш-файлу на основе хэша пути к файлу.
+        Генерирует путь к кэш-файлу на основе хэша пути, времени изменения и размера файла.
         
         Args:
             file_path: Путь к исходному файлу
@@ -756,8 +807,15 @@ class CodeAnalyzer:
         """
         import hashlib
 
-        # Создаем хэш пути к файлу
-        file_hash = hashlib.md5(file_path.encode()).hexdigest()
+        # Учитываем время изменения и размер, чтобы правка файла сбрасывала кэш
+        try:
+            stat = os.stat(file_path)
+            cache_key = f"{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+        except OSError:
+            cache_key = file_path
+
+        # Создаем хэш ключа кэша
+        file_hash = hashlib.md5(cache_key.encode()).hexdigest()
 
         # Возвращаем путь к файлу кэша
         return os.path.join(self.cache_dir, 'docs', f"{file_hash}_{file_type}.json")
@@ -772,8 +830,12 @@ class CodeAnalyzer:
         """
         try:
             os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                with open(cache_path, 'wb') as f:
+                    f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+            else:
+                with open(cache_path, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
             logging.info(f"Результат сохранен в кэш: {cache_path}")
         except Exception as e:
             logging.warning(f"Не удалось сохранить кэш: {str(e)}")
@@ -790,10 +852,14 @@ class CodeAnalyzer:
         """
         try:
             if os.path.exists(cache_path):
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    result = json.load(f)
-                    logging.info(f"Результат загружен из кэша: {cache_path}")
-                    return result
+                if orjson is not None:
+                    with open(cache_path, 'rb') as f:
+                        result = orjson.loads(f.read())
+                else:
+                    with open(cache_path, 'r', encoding='utf-8') as f:
+                        result = json.load(f)
+                logging.info(f"Результат загружен из кэша: {cache_path}")
+                return result
         except Exception as e:
             logging.warning(f"Не удалось загрузить кэш: {str(e)}")
 
@@ -1,20 +1,37 @@
 import argparse
+import atexit
 import logging
+import logging.handlers
 import os
 import time
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Union
 
 from src.code_analyzer.code_analyzer import CodeAnalyzer
-from src.llm.llm_client import OllamaClient
+from src.llm.llm_client import get_ollama_client
 
 LOG_FILE = os.path.abspath("file_processor.log")
 
+# Количество записей, накапливаемых в памяти перед записью в лог-файл
+LOG_BUFFER_CAPACITY = 1024
 
-def setup_logging():
-    """Настройка логгера для тестов"""
+
+def setup_logging(level: Union[int, str] = logging.INFO):
+    """
+    Настройка логгера: вывод в консоль и в файл LOG_FILE.
+
+    Вызывается из точек входа приложения, а не при импорте модуля, чтобы
+    импорт пакета (например, в тестах) не добавлял обработчики к корневому логгеру.
+
+    Args:
+        level: Уровень логирования корневого логгера (по умолчанию INFO)
+    """
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level)
+
+    # Отладочные сообщения HTTP-клиентов не нужны и только замедляют работу
+    for noisy_logger in ("httpx", "httpcore", "urllib3"):
+        logging.getLogger(noisy_logger).setLevel(logging.WARNING)
 
     # Форматтер для файла
     file_formatter = logging.Formatter(
@@ -22,13 +39,19 @@ def setup_logging():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
-    # Очистка файла перед запуском
-    with open(LOG_FILE, 'w', encoding='utf-8') as f:
-        f.write("")
-
-    file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+    # Файл очищается при открытии (mode='w')
+    file_handler = logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8')
     file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+
+    # Записи копятся в памяти и сбрасываются в файл пачками, ошибки - сразу
+    buffered_handler = logging.handlers.MemoryHandler(
+        capacity=LOG_BUFFER_CAPACITY,
+        flushLevel=logging.ERROR,
+        target=file_handler
+    )
+    logger.addHandler(buffered_handler)
+    # Гарантируем, что лог будет полным при завершении процесса
+    atexit.register(buffered_handler.flush)
 
     # Цветной форматтер для консоли
     class ColoredFormatter(logging.Formatter):
@@ -55,8 +78,6 @@ def setup_logging():
     logger.addHandler(console_handler)
 
 
-setup_logging()
-
 
 def parse_args() -> argparse.Namespace:
     """
@@ -133,15 +154,15 @@ def process_context_files(context_arg: str) -> List[str]:
     paths = [path.strip() for path in context_arg.split(',')]
 
     # Список поддерживаемых расширений для анализа кода
-    code_extensions = ['.kt', '.java']
+    code_extensions = {'.kt', '.java'}
 
     # Расширенный список поддерживаемых расширений для контекста
     # Включаем также текстовые файлы, конфигурации, документацию и т.д.
-    context_extensions = code_extensions + [
+    context_extensions = code_extensions | {
         '.txt', '.md', '.json', '.yaml', '.yml', '.xml', '.properties',
         '.gradle', '.toml', '.csv', '.html', '.css', '.js', '.ts',
         '.c', '.cpp', '.h', '.py', '.sh', '.bat', '.config'
-    ]
+    }
 
     # Проверяем существование файлов и директорий
     valid_paths = []
@@ -174,22 +195,24 @@ def process_context_files(context_arg: str) -> List[str]:
             # Если это директория, рекурсивно ищем все поддерживаемые файлы
             logging.info(f"Обработка директории контекста: {path}")
 
-            # Сначала ищем файлы кода (они наиболее важны для контекста)
-            code_files_added = 0
-            for ext in code_extensions:
-                # Используем Path для рекурсивного поиска файлов
-                dir_files = list(Path(path).rglob(f"*{ext}"))
-                for file_path in dir_files:
-                    valid_paths.append(str(file_path))
-                    code_files_added += 1
-
-            # Затем ищем другие поддерживаемые типы файлов
-            other_files_added = 0
-            for ext in [e for e in context_extensions if e not in code_extensions]:
-                dir_files = list(Path(path).rglob(f"*{ext}"))
-                for file_path in dir_files:
-                    valid_paths.append(str(file_path))
-                    other_files_added += 1
+            # Обходим директорию один раз и раскладываем файлы по расширению
+            code_files = []
+            other_files = []
+            for file_path in Path(path).rglob("*"):
+                ext = file_path.suffix.lower()
+                if ext not in context_extensions or not file_path.is_file():
+                    continue
+                if ext in code_extensions:
+                    code_files.append(str(file_path))
+                else:
+                    other_files.append(str(file_path))
+
+            # Сначала идут файлы кода (они наиболее важны для контекста).
+            # Порядок rglob зависит от файловой системы, поэтому сортируем пути
+            valid_paths.extend(sorted(code_files))
+            valid_paths.extend(sorted(other_files))
+            code_files_added = len(code_files)
+            other_files_added = len(other_files)
 
             # Логгируем найденные файлы
             if code_files_added > 0:
@@ -526,7 +549,7 @@ def analyze_code(args: argparse.Namespace) -> None:
 
     try:
         # Создаем клиент Ollama
-        client = OllamaClient()
+        client = get_ollama_client()
 
         # Создаем анализатор кода
         analyzer = CodeAnalyzer(client)
@@ -543,6 +566,9 @@ def main():
     # Обрабатываем аргументы командной строки
     args = parse_args()
 
+    # Настраиваем логирование с уровнем из аргументов
+    setup_logging(args.log_level)
+
     # Запускаем анализ
     logging.info("Запуск анализатора кода")
     analyze_code(args)
@@ -1,33 +1,89 @@
+import asyncio
+import concurrent.futures
+import functools
 import json
 import logging
 import os
 import platform
 import re
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
+import httpx
 import ollama
 
+# Имя класса в исходном коде (используется при формировании пустой документации)
+_CLASS_NAME_RE = re.compile(r'class\s+(\w+)')
+
+# Разметка фрагментов кода и инструкция для пакетного запроса (analyze_code_batch)
+_BATCH_SNIPPET_TEMPLATE = "<<<ФРАГМЕНТ {number}>>>\n{code}\n<<<КОНЕЦ ФРАГМЕНТА {number}>>>"
+_BATCH_RESPONSE_INSTRUCTION = """
+
+[ПАКЕТНЫЙ РЕЖИМ]
+Код выше содержит {count} фрагментов, разделенных маркерами <<<ФРАГМЕНТ N>>>.
+Для КАЖДОГО фрагмента подготовьте отдельную документацию по правилам выше.
+Верните ТОЛЬКО JSON-объект вида {{"docs": ["<KDoc фрагмента 1>", "<KDoc фрагмента 2>", ...]}},
+содержащий {count} строк в порядке следования фрагментов."""
+
+# Поля с метриками, которые Ollama передает в последней части потокового ответа
+_RESPONSE_METRIC_KEYS = (
+    'prompt_eval_count', 'eval_count', 'eval_duration',
+    'prompt_eval_duration', 'total_duration', 'load_duration'
+)
+
+
 class OllamaClient:
-    def __init__(self):
+    # Типы файлов, для которых есть промпт документирования
+    SUPPORTED_FILE_TYPES = frozenset({'kotlin'})
+    # Модель, используемая, если имя модели не передано явно
+    DEFAULT_MODEL = 'qwen2.5-coder:7b'
+
+    def __init__(self, host: Optional[str] = None, client: Optional[ollama.Client] = None,
+                 model: Optional[str] = None, keep_alive: Optional[Union[str, float]] = None,
+                 async_client: Optional[ollama.AsyncClient] = None,
+                 timeout: Optional[Union[float, httpx.Timeout]] = None):
         """
         Инициализация клиента Ollama.
         Использует первую доступную запущенную модель.
+
+        Args:
+            host: Адрес сервера Ollama (по умолчанию берется из OLLAMA_HOST)
+            client: Готовый ollama.Client (например, с собственными таймаутами и
+                лимитами соединений); если не указан, создается новый
+            model: Имя модели Ollama (по умолчанию DEFAULT_MODEL)
+            keep_alive: Время, в течение которого модель остается в памяти после
+                запроса (например, "30m" или -1 - без выгрузки); по умолчанию
+                используется настройка сервера Ollama
+            async_client: Готовый ollama.AsyncClient для асинхронных запросов
+                (закрывает вызывающий код); если не указан, на каждый вызов
+                создается клиент с адресом host и таймаутом timeout
+            timeout: Таймаут HTTP-запросов к серверу (секунды или httpx.Timeout);
+                используется для создаваемых клиентов, по умолчанию без таймаута
         """
+        # Один HTTP-клиент на весь срок жизни объекта: соединение с сервером
+        # переиспользуется между запросами (keep-alive)
+        self.host = host
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.client = client or ollama.Client(host=host, timeout=timeout)
+        self.async_client = async_client
         try:
-            models = ollama.list()
+            models = self.client.list()
             available_models = models.get('models', [])
             if not available_models:
                 raise RuntimeError("Нет запущенных моделей Ollama")
+            # Сохраняем список моделей, чтобы не запрашивать его у сервера повторно
+            self.available_models = frozenset(
+                entry['model'] for entry in available_models if 'model' in entry)
 
-            selected_model_name = 'qwen2.5-coder:7b'
+            selected_model_name = model or self.DEFAULT_MODEL
             ollama_model = self.select_model(available_models, selected_model_name)
             if 'model' not in ollama_model:
                 raise ValueError("Некорректный формат данных модели: отсутствует поле 'name'")
 
             self.current_model = ollama_model['model']
             # Получаем детальную информацию о модели
-            model_response = ollama.show(self.current_model)
+            model_response = self.client.show(self.current_model)
 
             # Форматируем размер модели
             size_bytes = int(ollama_model.get('size', 0))
@@ -63,7 +119,7 @@ class OllamaClient:
             logging.info(f"- Количество голов внимания в каждом слое: {self.head_count}")
             logging.info(f"- Количество голов для ключей/значений: {self.head_count_kv}")
 
-            # Сохраняем структуру
+            # Сохраняем структуру (ответ ollama.show для текущей модели)
             self.model_details = model_response
 
         except KeyError as e:
@@ -89,9 +145,18 @@ class OllamaClient:
 
     def get_value_by_key(self, model_info, key):
         if isinstance(model_info, dict):
-            for info_key in model_info.keys():
-                if key in info_key:
-                    return model_info[info_key]
+            # Ключи имеют вид '<архитектура>.<параметр>', поэтому сначала пробуем прямой доступ
+            arch = model_info.get('general.architecture')
+            if arch:
+                value = model_info.get(f'{arch}.{key}')
+                if value is not None:
+                    return value
+
+            # Вложенные параметры (например, '<архитектура>.attention.head_count')
+            suffix = f'.{key}'
+            for info_key, value in model_info.items():
+                if info_key.endswith(suffix):
+                    return value
             logging.error(f"Ключ '{key}' не найден в model_info", exc_info=True)
         else:
             logging.error("model_info должен быть словарем", exc_info=True)
@@ -108,6 +173,23 @@ class OllamaClient:
         # Минимум 200 токенов, максимум 3000
         return max(200, min(estimated_tokens, 3000))
 
+    @staticmethod
+    def estimate_context_tokens(context: Optional[Dict[str, str]]) -> int:
+        """
+        Оценивает размер контекста в токенах без обращения к модели.
+
+        Args:
+            context: Контекстная информация {название: содержимое}
+
+        Returns:
+            Примерное количество токенов (~3 байта на токен и ~20 токенов
+            на заголовок и форматирование каждого раздела), 0 без контекста
+        """
+        if not context:
+            return 0
+        context_size = sum(len(str(content).encode()) // 3 for content in context.values())
+        return context_size + len(context) * 20
+
     def _get_model_params(self, code: str, prompt_size: int, file_type: str,
                           context: Optional[Dict[str, str]] = None) -> dict:
         """Формирует параметры запроса к модели."""
@@ -125,10 +207,7 @@ class OllamaClient:
         # Обработка контекста
         if context:
             # Используем только для оценки размера, не формируем системный промпт здесь
-            # Добавляем токены на заголовки и форматирование
-            context_size = sum(
-                len(str(content).encode()) // 3 for content in context.values())
-            context_size += len(context) * 20  # ~20 токенов на заголовки и форматирование
+            context_size = self.estimate_context_tokens(context)
             system_tokens += context_size
 
             # Логируем только статистику, не содержимое
@@ -221,6 +300,9 @@ class OllamaClient:
         logging.info(f"- Время загрузки модели: {metrics['load_duration'] / 1e9:.2f} сек")
         logging.info(f"- Время обработки промпта: {metrics['prompt_eval_duration'] / 1e9:.2f} сек")
         logging.info(f"- Время генерации: {metrics['generation_time'] / 1e9:.2f} сек")
+        if 'time_to_first_token' in metrics:
+            logging.info(
+                f"- Время до первого токена: {metrics['time_to_first_token'] / 1e9:.2f} сек")
 
         # Логируем метрики токенов
         logging.info(f"- Токены промпта: {metrics['prompt_tokens']}")
@@ -241,13 +323,23 @@ class OllamaClient:
                         value_mb = value / (1024 * 1024)  # Конвертируем в МБ
                         logging.info(f"- {key}: {value_mb:.2f} МБ")
 
-    def analyze_code(self, code: str, file_type: str, context: Optional[Dict[str, str]] = None) -> \
-            Optional[dict]:
-        """Анализирует код и генерирует документацию."""
+    def analyze_code(self, code: str, file_type: str, context: Optional[Dict[str, str]] = None,
+                     options: Optional[Dict] = None,
+                     stop_markers: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        Анализирует код и генерирует документацию.
+
+        Args:
+            code: Исходный код
+            file_type: Тип файла (поддерживается только 'kotlin')
+            context: Контекстная информация {название: содержимое}
+            options: Параметры модели, переопределяющие вычисленные автоматически
+                (например, {"num_predict": 8} для короткого ответа)
+            stop_markers: Строки, после появления всех которых генерация прерывается
+                (документация будет неполной, метрики генерации - нулевыми)
+        """
         # Проверяем тип файла
-        if file_type != 'kotlin':
-            raise ValueError(
-                f"Неподдерживаемый тип файла: {file_type}. Поддерживается только Kotlin.")
+        self._check_file_type(file_type)
 
         # Проверяем наличие кода
         if not code or not code.strip():
@@ -257,27 +349,286 @@ class OllamaClient:
         logging.info(f"Тип файла: {file_type}")
 
         try:
-            # Формируем системный промпт
-            system_prompt = ""
+            prompt, system_prompt, model_params = self._prepare_request(
+                code, file_type, context, options)
+
+            logging.info("\nОтправляем запрос к модели...")
+            logging.info(f"Весь системный промпт имеет размер: {len(system_prompt)}")
+
+            # Отправляем запрос к модели с системным промптом в потоковом режиме
+            stream = self.client.generate(
+                model=self.current_model,
+                prompt=prompt,
+                system=system_prompt,
+                options=model_params,
+                keep_alive=self.keep_alive,
+                stream=True
+            )
+            response, time_to_first_token = self._collect_stream(stream, stop_markers)
+
+            return self._build_result(response, code, time_to_first_token)
+
+        except Exception as e:
+            error_msg = f"Неизвестная ошибка: {str(e)}"
+            logging.error(error_msg, exc_info=True)
+            return self._create_error_response(error_msg)
+
+    async def analyze_code_async(self, code: str, file_type: str,
+                                 context: Optional[Dict[str, str]] = None,
+                                 options: Optional[Dict] = None,
+                                 client: Optional[ollama.AsyncClient] = None) -> Optional[dict]:
+        """
+        Асинхронный вариант analyze_code на основе ollama.AsyncClient.
+
+        Позволяет отправлять несколько запросов к модели одновременно
+        (например, через asyncio.gather), не дожидаясь завершения предыдущих.
+        Если client не передан, используется async_client из конструктора, а при
+        его отсутствии создается временный клиент, который закрывается после запроса.
+        """
+        # Проверяем тип файла
+        self._check_file_type(file_type)
+
+        # Проверяем наличие кода
+        if not code or not code.strip():
+            return self._create_error_response("пустой код")
+
+        logging.info(f"\n{'=' * 50}\nНачало асинхронного анализа кода\n{'=' * 50}")
+        logging.info(f"Тип файла: {file_type}")
+
+        try:
+            prompt, system_prompt, model_params = self._prepare_request(
+                code, file_type, context, options)
+
+            logging.info("\nОтправляем асинхронный запрос к модели...")
+
+            client = client or self.async_client
+            if client is None:
+                async with ollama.AsyncClient(host=self.host, timeout=self.timeout) as own_client:
+                    return await self._generate_async(own_client, code, prompt,
+                                                      system_prompt, model_params)
+            return await self._generate_async(client, code, prompt, system_prompt, model_params)
+
+        except Exception as e:
+            error_msg = f"Неизвестная ошибка: {str(e)}"
+            logging.error(error_msg, exc_info=True)
+            return self._create_error_response(error_msg)
+
+    async def _generate_async(self, client: ollama.AsyncClient, code: str, prompt: str,
+                              system_prompt: str, model_params: dict) -> dict:
+        """Отправляет подготовленный запрос через AsyncClient и формирует результат."""
+        # Потоковый режим, как и в analyze_code: без долгих пауз на буферизации
+        # ответа и с измерением времени до первого токена
+        stream = await client.generate(
+            model=self.current_model,
+            prompt=prompt,
+            system=system_prompt,
+            options=model_params,
+            keep_alive=self.keep_alive,
+            stream=True
+        )
+        response, time_to_first_token = await self._collect_stream_async(stream)
+
+        return self._build_result(response, code, time_to_first_token)
+
+    def analyze_codes(self, items: List[Tuple[str, str, Optional[Dict[str, str]]]],
+                      options: Optional[Dict] = None) -> List[dict]:
+        """
+        Анализирует несколько фрагментов кода за один вызов.
+
+        Ollama не объединяет разные промпты в один запрос, поэтому запросы
+        отправляются одновременно через AsyncClient и обрабатываются сервером
+        параллельно (в пределах OLLAMA_NUM_PARALLEL).
+
+        Метод синхронный и запускает собственный цикл событий. Если он вызван
+        из работающего цикла (асинхронный код, Jupyter), запросы выполняются
+        в отдельном потоке со своим циклом, а вызывающий поток ждет результата.
+        Асинхронному коду лучше напрямую ожидать analyze_code_async через
+        asyncio.gather.
+
+        Args:
+            items: Список кортежей (код, тип файла, контекст)
+            options: Параметры модели, переопределяющие вычисленные автоматически
+
+        Returns:
+            Список результатов в том же порядке, что и входные данные
+        """
+        async def gather_all(client: ollama.AsyncClient):
+            return await asyncio.gather(*(
+                self.analyze_code_async(code, file_type, context, options, client)
+                for code, file_type, context in items
+            ))
+
+        async def analyze_all():
+            if self.async_client is not None:
+                return await gather_all(self.async_client)
+            # Общий асинхронный клиент: все запросы используют один пул соединений,
+            # который закрывается после завершения всех запросов
+            async with ollama.AsyncClient(host=self.host, timeout=self.timeout) as client:
+                return await gather_all(client)
+
+        logging.info(f"Пакетный анализ кода: {len(items)} фрагментов")
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return list(asyncio.run(analyze_all()))
+
+        # asyncio.run нельзя вызвать из работающего цикла событий
+        logging.warning(
+            "analyze_codes вызван из работающего цикла событий, запросы выполняются в отдельном потоке")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return list(executor.submit(asyncio.run, analyze_all()).result())
+
+    def analyze_code_batch(self, snippets: List[Tuple[str, str]],
+                           options: Optional[Dict] = None) -> List[dict]:
+        """
+        Документирует несколько фрагментов кода одним запросом к модели.
+
+        Фрагменты объединяются в один промпт с разделителями, а модель возвращает
+        JSON-объект со списком документаций в порядке следования фрагментов.
+        Так промпт с правилами обрабатывается один раз, а не для каждого фрагмента.
+        Фрагменты разных типов отправляются отдельными пакетами (по одному на тип).
+        Если ответ не удалось разобрать, фрагменты анализируются отдельными
+        запросами через analyze_codes.
+
+        Args:
+            snippets: Список кортежей (код, тип файла)
+            options: Параметры модели, переопределяющие вычисленные автоматически
+
+        Returns:
+            Список результатов в том же порядке, что и входные фрагменты
+        """
+        for _, file_type in snippets:
+            self._check_file_type(file_type)
+
+        # Пустые фрагменты в запрос не отправляем, остальные группируем по типу файла
+        results: List[Optional[dict]] = [None] * len(snippets)
+        groups: Dict[str, List[int]] = {}
+        for index, (code, file_type) in enumerate(snippets):
+            if not code or not code.strip():
+                results[index] = self._create_error_response("пустой код")
+            else:
+                groups.setdefault(file_type, []).append(index)
+
+        for file_type, pending in groups.items():
+            codes = [snippets[index][0] for index in pending]
+            for index, result in zip(pending, self._analyze_batch_group(codes, file_type, options)):
+                results[index] = result
+
+        return results
+
+    def _analyze_batch_group(self, codes: List[str], file_type: str,
+                             options: Optional[Dict] = None) -> List[dict]:
+        """
+        Документирует непустые фрагменты одного типа одним запросом к модели.
+
+        Args:
+            codes: Непустые фрагменты кода в порядке следования
+            file_type: Общий тип файла фрагментов
+            options: Параметры модели, переопределяющие вычисленные автоматически
+
+        Returns:
+            Список результатов в том же порядке, что и фрагменты
+        """
+        logging.info(f"Пакетный анализ кода одним запросом: {len(codes)} фрагментов ({file_type})")
+
+        try:
+            prompt, system_prompt, model_params = self._prepare_batch_request(
+                codes, file_type, options)
+
+            stream = self.client.generate(
+                model=self.current_model,
+                prompt=prompt,
+                system=system_prompt,
+                options=model_params,
+                format='json',
+                keep_alive=self.keep_alive,
+                stream=True
+            )
+            response, time_to_first_token = self._collect_stream(stream)
+
+            docs = json.loads(response['response']).get('docs')
+            if not isinstance(docs, list) or len(docs) != len(codes):
+                raise ValueError(f"ожидался список из {len(codes)} документаций")
+
+        except Exception as e:
+            logging.warning(
+                f"Пакетный запрос не удался ({str(e)}), анализируем фрагменты по отдельности")
+            return self.analyze_codes([(code, file_type, None) for code in codes], options)
+
+        metrics = self._calculate_metrics(response, time_to_first_token)
+        metrics["batch_size"] = len(codes)
+        self._log_model_response(response, metrics)
+
+        return [
+            self._create_success_response(
+                documentation if isinstance(documentation, str) else '', code, dict(metrics))
+            for code, documentation in zip(codes, docs)
+        ]
+
+    def _prepare_batch_request(self, codes: List[str], file_type: str,
+                               options: Optional[Dict] = None) -> Tuple[str, str, dict]:
+        """
+        Формирует промпт, системный промпт и параметры пакетного запроса к модели.
+
+        Args:
+            codes: Непустые фрагменты кода в порядке следования
+            file_type: Общий тип файла фрагментов
+            options: Параметры модели, переопределяющие вычисленные автоматически
+
+        Returns:
+            Кортеж (промпт, системный промпт, параметры модели)
+        """
+        combined_code = "\n".join(
+            _BATCH_SNIPPET_TEMPLATE.format(number=number, code=code.strip())
+            for number, code in enumerate(codes, start=1)
+        )
+        prompt, system_prompt, model_params = self._prepare_request(combined_code, file_type)
+        prompt += _BATCH_RESPONSE_INSTRUCTION.format(count=len(codes))
+
+        # Ответ должен вместить документацию для каждого фрагмента
+        model_params["num_predict"] = sum(self._estimate_doc_size(code) + 200 for code in codes)
+
+        # Контекст должен вместить и промпт, и все документации, но не больше
+        # безопасного предела модели (80% от максимума, как в _get_model_params)
+        input_tokens = len((system_prompt + prompt).encode()) // 3
+        model_params["num_ctx"] = min(
+            max(model_params["num_ctx"], input_tokens + model_params["num_predict"]),
+            int(self.context_length * 0.8))
+
+        if options:
+            model_params.update(options)
+        return prompt, system_prompt, model_params
+
+    def _prepare_request(self, code: str, file_type: str,
+                         context: Optional[Dict[str, str]] = None,
+                         options: Optional[Dict] = None) -> Tuple[str, str, dict]:
+        """
+        Формирует промпт, системный промпт и параметры запроса к модели.
+
+        Returns:
+            Кортеж (промпт, системный промпт, параметры модели)
+        """
+        # Формируем системный промпт
+        system_prompt = ""
+
+        # 1. Добавляем контекстную информацию, если она есть
+        if context:
+            logging.info(f"Добавляем контекст в системный промпт: {len(context)} файлов")
 
-            # 1. Добавляем контекстную информацию, если она есть
+            # Добавляем контекст в системный промпт
             if context:
-                logging.info(f"Добавляем контекст в системный промпт: {len(context)} файлов")
-
-                # Добавляем контекст в системный промпт
-                if context:
-                    system_prompt += "\n=== Контекстная информация ===\n"
-                    for path, content in context.items():
-                        system_prompt += f"{content.strip()}\n"
-            
-            # 2. Добавляем основной системный промпт
-            system_prompt += """Вы - опытный разработчик, создающий документацию ИСКЛЮЧИТЕЛЬНО на РУССКОМ языке в формате KDoc.  
+                system_prompt += "\n=== Контекстная информация ===\n"
+                for path, content in context.items():
+                    system_prompt += f"{content.strip()}\n"
+        
+        # 2. Добавляем основной системный промпт
+        system_prompt += """Вы - опытный разработчик, создающий документацию ИСКЛЮЧИТЕЛЬНО на РУССКОМ языке в формате KDoc.  
             ВНИМАНИЕ: ВАЖНО! Документация ДОЛЖНА быть на РУССКОМ языке!  
 Ваша задача - добавить **полную и строгую документацию** к классу, используя только следующие аннотации:  
 `@property`, `@constructor`, `@param`, `@return`, `@see`
 """
-            # 3. Добавляем важные требования
-            system_prompt +="""
+        # 3. Добавляем важные требования
+        system_prompt +="""
 Важные требования:
 1. Вернуть ТОЛЬКО документацию класса, БЕЗ КОДА
 2. НЕ создавать отдельную документацию для методов
@@ -291,91 +642,175 @@ class OllamaClient:
 5. Включайте информацию о взаимодействии с другими компонентами
 6. Описывайте особенности реализации из контекста"""
 
-            # Создаем промпт с кодом и контекстом
-            prompt = self._create_documentation_prompt(code, file_type)
+        # Создаем промпт с кодом и контекстом
+        prompt = self._create_documentation_prompt(code, file_type)
 
-            # Получаем адаптивные параметры запроса
-            model_params = self._get_model_params(code, len(prompt.encode()), file_type, context)
+        # Получаем адаптивные параметры запроса
+        model_params = self._get_model_params(code, len(prompt.encode()), file_type, context)
+        if options:
+            model_params.update(options)
+            logging.info(f"Параметры модели переопределены: {options}")
 
-            logging.info("\nОтправляем запрос к модели...")
-            logging.info(f"Весь системный промпт имеет размер: {len(system_prompt)}")
+        return prompt, system_prompt, model_params
 
-            # Отправляем запрос к модели с системным промптом
-            response = ollama.generate(
-            model=self.current_model,
-                prompt=prompt,
-            system=system_prompt,
-                options=model_params
-            )
+    def _collect_stream(self, stream,
+                        stop_markers: Optional[List[str]] = None) -> Tuple[dict, Optional[int]]:
+        """
+        Собирает потоковый ответ модели в единый ответ.
 
-            # Получаем метрики из ответа
-            prompt_eval_count = response.get('prompt_eval_count', 0)  # Токены промпта
-            eval_count = response.get('eval_count', 0)  # Токены ответа
-            eval_duration = response.get('eval_duration', 0)  # Время генерации
-            prompt_eval_duration = response.get('prompt_eval_duration',
-                                                0)  # Время обработки промпта
-            total_duration = response.get('total_duration', 0)  # Общее время
-            load_duration = response.get('load_duration', 0)  # Время загрузки модели
-
-            # Вычисляем токены
-            prompt_tokens = prompt_eval_count  # Токены промпта
-            completion_tokens = eval_count  # Токены ответа
-            total_tokens = prompt_tokens + completion_tokens  # Общее количество токенов
-
-            # Вычисляем время генерации (в наносекундах)
-            generation_time = eval_duration
-
-            # Вычисляем скорость генерации (токенов в секунду)
-            # eval_duration в наносекундах, поэтому умножаем на 1e9
-            generation_speed = (eval_count / eval_duration * 1e9) if eval_duration > 0 else 0
-
-            # Вычисляем среднее время на токен (в миллисекундах)
-            time_per_token = (eval_duration / eval_count / 1e6) if eval_count > 0 else 0
-
-            # Формируем метрики
-            metrics = {
-                "total_tokens": total_tokens,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_duration": total_duration,
-                "load_duration": load_duration,
-                "prompt_eval_duration": prompt_eval_duration,
-                "generation_time": generation_time,
-                "generation_speed": round(generation_speed, 2),
-                "time_per_token": round(time_per_token, 2)
-            }
+        Args:
+            stream: Итератор частей ответа Client.generate(stream=True)
+            stop_markers: Строки, после появления всех которых чтение потока
+                прекращается, а запрос к серверу закрывается
 
-            # Логируем информацию о работе модели
-            self._log_model_response(response, metrics)
+        Returns:
+            Кортеж (ответ в формате непотокового запроса, время до первого токена в нс)
+        """
+        start_time = time.perf_counter_ns()
+        time_to_first_token = None
+        response_parts = []
+        last_chunk = {}
+
+        pending_markers = set(stop_markers or ())
+        # Маркер может прийти по частям, поэтому ищем его и в конце уже полученного текста
+        overlap = max(map(len, pending_markers), default=1) - 1
+        tail = ''
+
+        for chunk in stream:
+            text = chunk.get('response') or ''
+            if text:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter_ns() - start_time
+                response_parts.append(text)
+            last_chunk = chunk
+
+            if pending_markers and text:
+                window = tail + text
+                pending_markers = {marker for marker in pending_markers if marker not in window}
+                tail = window[-overlap:] if overlap else ''
+                if not pending_markers:
+                    # Закрытие генератора закрывает HTTP-ответ, и сервер прекращает генерацию
+                    close = getattr(stream, 'close', None)
+                    if close:
+                        close()
+                    logging.info("Все маркеры получены, генерация остановлена досрочно")
+                    break
+
+        return self._merge_stream(response_parts, last_chunk), time_to_first_token
+
+    async def _collect_stream_async(self, stream) -> Tuple[dict, Optional[int]]:
+        """
+        Собирает асинхронный потоковый ответ модели в единый ответ.
 
-            # Получаем документацию из ответа
-            documentation = response.get('response', '').strip()
+        Args:
+            stream: Асинхронный итератор частей ответа AsyncClient.generate(stream=True)
 
-                # Проверяем наличие документации
-            if not documentation or not "/**" in documentation:
-                documentation = self._create_empty_java_doc(code)
-                logging.warning("Модель вернула некорректный ответ, создана базовая документация")
+        Returns:
+            Кортеж (ответ в формате непотокового запроса, время до первого токена в нс)
+        """
+        start_time = time.perf_counter_ns()
+        time_to_first_token = None
+        response_parts = []
+        last_chunk = {}
+
+        async for chunk in stream:
+            text = chunk.get('response') or ''
+            if text:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter_ns() - start_time
+                response_parts.append(text)
+            last_chunk = chunk
+
+        return self._merge_stream(response_parts, last_chunk), time_to_first_token
+
+    @staticmethod
+    def _merge_stream(response_parts: List[str], last_chunk) -> dict:
+        """Объединяет части потокового ответа и метрики последней части в один ответ."""
+        # Метрики приходят в последней части ответа
+        response = {key: last_chunk.get(key) or 0 for key in _RESPONSE_METRIC_KEYS}
+        response['response'] = ''.join(response_parts)
+        return response
+
+    def _build_result(self, response, code: str, time_to_first_token: Optional[int] = None) -> dict:
+        """Формирует результат анализа из ответа модели."""
+        metrics = self._calculate_metrics(response, time_to_first_token)
+
+        # Логируем информацию о работе модели
+        self._log_model_response(response, metrics)
+
+        return self._create_success_response(response.get('response', ''), code, metrics)
+
+    def _calculate_metrics(self, response, time_to_first_token: Optional[int] = None) -> dict:
+        """Вычисляет метрики выполнения запроса по ответу модели."""
+        # Получаем метрики из ответа
+        prompt_eval_count = response.get('prompt_eval_count', 0)  # Токены промпта
+        eval_count = response.get('eval_count', 0)  # Токены ответа
+        eval_duration = response.get('eval_duration', 0)  # Время генерации
+        prompt_eval_duration = response.get('prompt_eval_duration',
+                                            0)  # Время обработки промпта
+        total_duration = response.get('total_duration', 0)  # Общее время
+        load_duration = response.get('load_duration', 0)  # Время загрузки модели
+
+        # Вычисляем токены
+        prompt_tokens = prompt_eval_count  # Токены промпта
+        completion_tokens = eval_count  # Токены ответа
+        total_tokens = prompt_tokens + completion_tokens  # Общее количество токенов
+
+        # Вычисляем время генерации (в наносекундах)
+        generation_time = eval_duration
+
+        # Вычисляем скорость генерации (токенов в секунду)
+        # eval_duration в наносекундах, поэтому умножаем на 1e9
+        generation_speed = (eval_count / eval_duration * 1e9) if eval_duration > 0 else 0
+
+        # Вычисляем среднее время на токен (в миллисекундах)
+        time_per_token = (eval_duration / eval_count / 1e6) if eval_count > 0 else 0
+
+        # Формируем метрики
+        metrics = {
+            "total_tokens": total_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_duration": total_duration,
+            "load_duration": load_duration,
+            "prompt_eval_duration": prompt_eval_duration,
+            "generation_time": generation_time,
+            "generation_speed": round(generation_speed, 2),
+            "time_per_token": round(time_per_token, 2)
+        }
+        if time_to_first_token is not None:
+            metrics["time_to_first_token"] = time_to_first_token
 
-            # Формируем результат
-            result = {
-                "documentation": documentation,
-                    "status": "success",
-                "metrics": metrics
-            }
+        return metrics
 
-            return result
+    def _create_success_response(self, documentation: str, code: str, metrics: dict) -> dict:
+        """Создает ответ с документацией (базовой, если модель вернула некорректный ответ)."""
+        documentation = documentation.strip()
 
-        except Exception as e:
-            error_msg = f"Неизвестная ошибка: {str(e)}"
-            logging.error(error_msg, exc_info=True)
-            return self._create_error_response(error_msg)
+        # Проверяем наличие документации
+        if not documentation or not "/**" in documentation:
+            documentation = self._create_empty_java_doc(code)
+            logging.warning("Модель вернула некорректный ответ, создана базовая документация")
 
-    def _create_documentation_prompt(self, code: str, file_type: str) -> str:
-        """Создает промпт для генерации документации."""
-        if file_type != 'kotlin':
+        # Формируем результат
+        result = {
+            "documentation": documentation,
+            "status": "success",
+            "metrics": metrics
+        }
+
+        return result
+
+    def _check_file_type(self, file_type: str):
+        """Проверяет, что тип файла поддерживается (до любых обращений к модели)."""
+        if file_type not in self.SUPPORTED_FILE_TYPES:
             raise ValueError(
                 f"Неподдерживаемый тип файла: {file_type}. Поддерживается только Kotlin.")
 
+    def _create_documentation_prompt(self, code: str, file_type: str) -> str:
+        """Создает промпт для генерации документации."""
+        self._check_file_type(file_type)
+
         prompt_template = f"""[ПРАВИЛА ДОКУМЕНТИРОВАНИЯ KDOC]
 #### ПРАВИЛА ДОКУМЕНТИРОВАНИЯ:
 **Документация класса:**
@@ -510,7 +945,7 @@ class OllamaClient:
 
     def _create_empty_java_doc(self, code: str) -> str:
         """Создает пустую Java документацию для класса."""
-        class_name = re.search(r'class\s+(\w+)', code)
+        class_name = _CLASS_NAME_RE.search(code)
         if not class_name:
             return "/** Документация отсутствует */"
 
@@ -525,3 +960,18 @@ class OllamaClient:
  * **Взаимодействие:**
  * - Нет
  */"""
+
+
+@functools.lru_cache(maxsize=4)
+def get_ollama_client(host: Optional[str] = None, model: Optional[str] = None) -> OllamaClient:
+    """
+    Возвращает общий экземпляр OllamaClient для адреса сервера.
+
+    Повторные вызовы в одном процессе переиспользуют клиент вместе с его
+    HTTP-соединениями и уже полученными метаданными модели.
+
+    Args:
+        host: Адрес сервера Ollama (по умолчанию берется из OLLAMA_HOST)
+        model: Имя модели Ollama (по умолчанию OllamaClient.DEFAULT_MODEL)
+    """
+    return OllamaClient(host, model=model)
@@ -7,6 +7,7 @@ import sys
 import pytest
 
 from src.code_analyzer.code_analyzer import CodeAnalyzer
+from src.code_analyzer.file_processor import setup_logging
 
 
 def run_tests(verbose: bool, clear_logs: bool):
@@ -70,6 +71,10 @@ def main():
 
     args = parser.parse_args()
 
+    # При запуске тестов логами управляет pytest, обработчики нужны только для анализа
+    if not args.test:
+        setup_logging(logging.DEBUG if args.verbose else logging.INFO)
+
     # Очистка кэша если требуется
     if args.clean_cache:
         logging.info("Очистка кэша...")
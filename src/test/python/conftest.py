@@ -0,0 +1,28 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    """Регистрирует опции запуска медленных тестов и управления кэшем ответов модели"""
+    parser.addoption(
+        "--run-slow",
+        action="store_true",
+        default=False,
+        help="Запускать медленные тесты (помеченные @pytest.mark.slow)"
+    )
+    parser.addoption(
+        "--no-ollama-cache",
+        action="store_true",
+        default=False,
+        help="Не использовать сохраненные ответы модели (.pytest_cache/v/ollama_responses)"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Пропускает медленные тесты, если не передан флаг --run-slow"""
+    if config.getoption("--run-slow"):
+        return
+
+    skip_slow = pytest.mark.skip(reason="Медленный тест: используйте --run-slow для запуска")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
@@ -1,49 +1,301 @@
+import functools
+import hashlib
+import inspect
+import json
 import logging
-import shutil
-import sys
-from pathlib import Path
-from typing import Optional, Dict
 import os
+import re
+import shutil
+import socket
+import textwrap
 import time
-import inspect
 import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlparse
 
-# Корректная настройка путей
-ROOT_DIR = Path(__file__).parent.parent.parent  # Указываем на src/
-sys.path.append(str(ROOT_DIR.parent))
-
+import httpx
 import ollama
 import pytest
 from src.llm.llm_client import OllamaClient
 
+# При параллельном запуске (pytest -n) у каждого процесса xdist свой лог-файл
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "")
+STABILITY_LOG_FILE = f"stability_test_{XDIST_WORKER}.log" if XDIST_WORKER else "stability_test.log"
+
+# Число одновременных запросов к модели при предварительной отправке
+# (имеет смысл согласовать с OLLAMA_NUM_PARALLEL сервера)
+PREFETCH_WORKERS = int(os.environ.get("OLLAMA_NUM_PARALLEL") or 4)
+# Модели не выгружаются из памяти до конца сессии: каждый запрос без keep_alive
+# сбросил бы время жизни модели к значению сервера по умолчанию (5 минут)
+MODEL_KEEP_ALIVE = -1
+# Таймаут запросов к Ollama рассчитан на долгую генерацию; передается и в OllamaClient,
+# чтобы асинхронные клиенты создавались с тем же таймаутом
+OLLAMA_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+# Запускать тяжелые тесты даже без GPU (на CPU они выполняются минутами)
+FORCE_HEAVY = os.environ.get("OLLAMA_FORCE_HEAVY") == "1"
+
+# Директория с исходниками, используемыми в тестах
+RESOURCES_DIR = Path(__file__).parent.parent / "resources"
+
+# Блок KDoc-комментария: от /** до ближайшего */
+KDOC_BLOCK_RE = re.compile(r'/\*\*.*?\*/', re.DOTALL)
+# Границы KDoc-блока (используются как маркеры остановки генерации)
+KDOC_DELIMITERS = ["/**", "*/"]
+
+# Основные элементы KDoc, которые ищутся в документации одним проходом
+KDOC_TOKENS = {
+    "kdoc_open": r"/\*\*",
+    "kdoc_close": r"\*/",
+    "property": r"@property",
+    "constructor": r"@constructor",
+    "see": r"@see",
+    "dependencies": r"Внешние зависимости:",
+    "interaction": r"Взаимодействие:",
+}
+KDOC_TOKEN_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in KDOC_TOKENS.items()))
+# Элементы, обязательные в документации любого класса (имена групп KDOC_TOKENS)
+KDOC_REQUIRED = frozenset({"kdoc_open", "kdoc_close", "dependencies", "interaction"})
+# Группы элементов, из каждой должен присутствовать хотя бы один
+KDOC_ANY_OF = (frozenset({"property", "constructor"}),)
+
+
+@functools.lru_cache(maxsize=None)
+def load_resource(name: str) -> str:
+    """Читает исходный файл из src/test/resources (с диска - один раз за сессию)"""
+    return (RESOURCES_DIR / name).read_text(encoding="utf-8")
+
+
+def get_ollama_address() -> Tuple[str, int]:
+    """Возвращает адрес сервера Ollama с учетом переменной окружения OLLAMA_HOST"""
+    host = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+    if "://" not in host:
+        host = f"http://{host}"
+    parsed = urlparse(host)
+    hostname = parsed.hostname or "127.0.0.1"
+    if hostname == "0.0.0.0":
+        hostname = "127.0.0.1"
+    return hostname, parsed.port or 11434
+
 
 @pytest.fixture(scope="session", autouse=True)
 def check_ollama_available():
-    """Проверка доступности Ollama перед тестами"""
+    """Быстрая проверка, что сервер Ollama принимает соединения"""
+    address = get_ollama_address()
     try:
-        models = ollama.list().get('models', [])
-        assert len(models) > 0, "Нет доступных моделей Ollama"
-    except Exception as e:
-        pytest.exit(f"Ошибка подключения к Ollama: {str(e)}")
+        socket.create_connection(address, timeout=0.5).close()
+    except OSError as e:
+        pytest.exit(f"Ошибка подключения к Ollama ({address[0]}:{address[1]}): {str(e)}")
+
+
+
+@pytest.fixture(scope="session")
+def ollama_http_client():
+    """
+    HTTP-клиент Ollama, общий для всей сессии тестов.
+
+    Соединения переиспользуются (keep-alive) с запасом под параллельные
+    запросы PREFETCH_WORKERS; таймаут рассчитан на долгую генерацию.
+    """
+    client = ollama.Client(
+        timeout=OLLAMA_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=PREFETCH_WORKERS,
+                            max_connections=PREFETCH_WORKERS * 2,
+                            keepalive_expiry=30.0)
+    )
+    yield client
+    client.close()
+
+
+class CachedGenerateClient:
+    """
+    Обертка ollama.Client, сохраняющая потоковые ответы generate в кэше pytest.
+
+    Ключ строится по фактическому запросу (модель, промпт, системный промпт,
+    параметры и формат), поэтому изменение шаблонов в OllamaClient дает новый
+    запрос к модели. В кэш попадают только сырые части ответа модели: разбор,
+    метрики и проверка документации выполняются клиентом при каждом воспроизведении.
+    Ответы, чтение которых прервано досрочно (stop_markers), не сохраняются.
+    Остальные методы передаются исходному клиенту без изменений.
+    """
+
+    def __init__(self, client: ollama.Client, cache):
+        self._wrapped = client
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def generate(self, **kwargs):
+        if not kwargs.get("stream"):
+            return self._wrapped.generate(**kwargs)
+        key = response_cache_key(*(kwargs.get(name) for name in
+                                   ("model", "prompt", "system", "options", "format")))
+        chunks = self._cache.get(key, None)
+        if chunks is not None:
+            return iter(chunks)
+        return self._record(key, self._wrapped.generate(**kwargs))
+
+    def _record(self, key: str, stream):
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk.model_dump(mode="json") if hasattr(chunk, "model_dump") else dict(chunk))
+            yield chunk
+        # Сюда доходит только полностью прочитанный ответ
+        self._cache.set(key, chunks)
+
+
+@pytest.fixture(scope="session")
+def response_cache(request):
+    """
+    Дисковый кэш сырых ответов модели между запусками тестов.
+
+    Повторный запуск с теми же запросами берет части ответа из .pytest_cache
+    без обращения к модели. Метрики в закэшированном ответе относятся
+    к исходной генерации. Кэш отключается флагом --no-ollama-cache
+    или переменной окружения OLLAMA_TEST_CACHE=0 (например, в CI).
+    """
+    if request.config.getoption("--no-ollama-cache") or os.environ.get("OLLAMA_TEST_CACHE") == "0":
+        return None
+    return request.config.cache
+
+
+@pytest.fixture(scope="session")
+def ollama_client(check_ollama_available, ollama_http_client, response_cache):
+    """Фикстура для реального клиента Ollama (один клиент на всю сессию тестов)"""
+    client = ollama_http_client
+    if response_cache is not None:
+        client = CachedGenerateClient(ollama_http_client, response_cache)
+    return OllamaClient(client=client, keep_alive=MODEL_KEEP_ALIVE, timeout=OLLAMA_TIMEOUT)
+
+
+@pytest.fixture(scope="session")
+def available_models(check_ollama_available, ollama_http_client):
+    """
+    Множество имен моделей, полученное отдельным запросом list() к серверу.
+
+    Запрос не зависит от OllamaClient, поэтому подходит для проверки выбора модели.
+    """
+    models = ollama_http_client.list().get('models') or []
+    return frozenset(entry['model'] for entry in models if 'model' in entry)
+
+
+@pytest.fixture(scope="session")
+def model_info(ollama_client):
+    """Метаданные текущей модели (ollama.show), полученные клиентом при инициализации"""
+    return ollama_client.model_details
 
 
-@pytest.fixture
-def ollama_client():
-    """Фикстура для реального клиента Ollama"""
-    return OllamaClient()
+def response_cache_key(*parts) -> str:
+    """Ключ ответа модели по входным данным запроса"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return f"ollama_responses/{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
 
 
-def test_real_model_initialization(ollama_client):
+def dedent_context(context: Dict[str, str]) -> Dict[str, str]:
+    """Убирает общий отступ и крайние пустые строки у разделов контекста (один раз при импорте)"""
+    return {title: textwrap.dedent(content).strip() for title, content in context.items()}
+
+
+@pytest.fixture(scope="session")
+def cached_analyze(ollama_client):
+    """
+    Вызов analyze_code, общий для тестов сессии.
+
+    Одинаковые запросы из разных тестов обслуживаются одной генерацией;
+    сырые ответы модели между запусками сохраняет CachedGenerateClient.
+    Тесты, проверяющие только наличие строк, передают их в stop_markers,
+    чтобы генерация останавливалась, как только все они получены.
+
+    Запросы выполняются в пуле потоков: analyze.prefetch(...) отправляет
+    запрос заранее и сразу возвращает Future, а analyze(...) дожидается
+    результата уже отправленного запроса.
+    """
+    executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                                  thread_name_prefix="ollama-prefetch")
+    futures: Dict[str, Future] = {}
+
+    def prefetch(code: str, file_type: str, context: Optional[Dict[str, str]] = None,
+                 options: Optional[Dict] = None,
+                 stop_markers: Optional[List[str]] = None) -> Future:
+        key = response_cache_key(code, file_type, context, options, stop_markers)
+        if key not in futures:
+            futures[key] = executor.submit(ollama_client.analyze_code, code, file_type,
+                                           context=context, options=options,
+                                           stop_markers=stop_markers)
+        return futures[key]
+
+    def analyze(code: str, file_type: str, context: Optional[Dict[str, str]] = None,
+                options: Optional[Dict] = None,
+                stop_markers: Optional[List[str]] = None) -> dict:
+        return prefetch(code, file_type, context, options, stop_markers).result()
+
+    analyze.prefetch = prefetch
+    yield analyze
+    # Неначатые запросы отменяются, а выполняющиеся дожидаются завершения:
+    # HTTP-клиент ollama_http_client закрывается уже после этой фикстуры
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def warm_model(ollama_client):
+    """
+    Загружает модель в память один раз перед тестами.
+
+    Модель остается загруженной до конца сессии (MODEL_KEEP_ALIVE), поэтому
+    ни один тест не платит за ее холодную загрузку. После тестов
+    возвращаем стандартное время жизни модели в Ollama.
+    """
+    model = ollama_client.current_model
+    ollama_client.client.generate(model=model, prompt=" ", options={"num_predict": 1},
+                                  keep_alive=MODEL_KEEP_ALIVE)
+    yield
+    ollama_client.client.generate(model=model, prompt=" ", options={"num_predict": 1}, keep_alive="5m")
+
+
+@pytest.fixture(scope="session")
+def heavy_backend(ollama_client, warm_model):
+    """
+    Пропускает тяжелые тесты, если модель работает без GPU.
+
+    После warm_model модель загружена, и ollama.ps() показывает, сколько
+    ее памяти размещено в видеопамяти (size_vram). Проверку отключает
+    OLLAMA_FORCE_HEAVY=1.
+    """
+    if FORCE_HEAVY:
+        return
+    running = ollama_client.client.ps().get('models') or []
+    size_vram = sum(model.get('size_vram') or 0 for model in running
+                    if model.get('model') == ollama_client.current_model)
+    logging.info(f"Модель {ollama_client.current_model} в видеопамяти: {size_vram / (1024 ** 3):.2f} GB")
+    if not size_vram:
+        pytest.skip("Модель работает на CPU: тяжелые тесты пропущены (OLLAMA_FORCE_HEAVY=1 для запуска)")
+
+
+@pytest.fixture(autouse=True)
+def debug_logging_for_verbose_tests(request, caplog):
+    """
+    Включает уровень DEBUG только для тестов с маркером verbose.
+
+    Полные тексты кода, контекста и документации логируются на уровне DEBUG,
+    поэтому в остальных тестах они отбрасываются до создания записи лога.
+    """
+    if request.node.get_closest_marker("verbose") is not None:
+        # caplog восстанавливает прежние уровни после теста
+        caplog.set_level(logging.DEBUG)
+
+
+def test_real_model_initialization(ollama_client, available_models):
     """Проверка инициализации с реальной моделью"""
-    models = ollama.list().get('models', [])
-    model_names = [m['model'] for m in models]  # Проверяем структуру ответа
-    assert ollama_client.current_model in model_names, "Модель не найдена в списке доступных"
+    assert OllamaClient.DEFAULT_MODEL in available_models, \
+        f"Модель {OllamaClient.DEFAULT_MODEL} не найдена на сервере Ollama"
+    assert ollama_client.current_model == OllamaClient.DEFAULT_MODEL, "Клиент выбрал другую модель"
 
 
-def test_real_model_parameters(ollama_client):
+def test_real_model_parameters(model_info):
     """Проверка параметров модели"""
-    model_info = ollama.show(ollama_client.current_model)
-
     log_model_info(model_info)
 
     assert model_info is not None, "Не удалось получить информацию о модели"
@@ -64,590 +316,703 @@ def test_missing_code(ollama_client):
     assert "пустой код" in result['error'], "Неверное сообщение об ошибке"
 
 
-@pytest.mark.skip
-def test_real_api_response(ollama_client):
-    """Проверка структуры ответа модели"""
-    code = """
-    class Test {
-        fun test() {}
+# Исходный код классов для тестов документирования
+HOME_FRAGMENT_CODE = textwrap.dedent("""
+class HomeFragment : Fragment() {
+    private lateinit var binding: FragmentHomeBinding
+    private val viewModel: HomeViewModel by viewModels()
+
+    override fun onCreateView(
+        inflater: LayoutInflater,
+        container: ViewGroup?,
+        savedInstanceState: Bundle?
+    ): View {
+        binding = FragmentHomeBinding.inflate(inflater, container, false)
+        return binding.root
     }
+}
+""").strip()
+
+DATA_PROCESSOR_CODE = textwrap.dedent("""
+class DataProcessor {
+    private val cache = mutableMapOf<String, Int>()
+
+    fun processData(data: List<String>): Map<String, Int> {
+        return data.groupBy { it }.mapValues { it.value.size }
+    }
+}
+""").strip()
+
+USER_REPOSITORY_CODE = textwrap.dedent("""
+class UserRepository {
+    private val userDao: UserDao
+
+    fun getUser(id: String): User? {
+        return userDao.findById(id)
+    }
+
+    fun saveUser(user: User) {
+        userDao.save(user)
+    }
+}
+""").strip()
+
+PAYMENT_PROCESSOR_CODE = textwrap.dedent("""
+interface PaymentProcessor {
+    /**
+     * Обрабатывает платеж на указанную сумму
+     * @param amount сумма платежа
+     * @return true если платеж успешен, false в противном случае
+     */
+    fun processPayment(amount: Double): Boolean
+
+    /**
+     * Проверяет валидность суммы платежа
+     * @param amount сумма для проверки
+     * @return true если сумма валидна, false в противном случае
+     */
+    fun validatePayment(amount: Double): Boolean
+}
+""").strip()
+
+ORDER_PROCESSOR_CODE = textwrap.dedent("""
+class OrderProcessor {
+    private val paymentService: PaymentService
+    private val notificationService: NotificationService
+
+    fun processOrder(order: Order): Boolean {
+        return if (paymentService.processPayment(order.total)) {
+            notificationService.notify(order.userId, "Заказ оплачен")
+            true
+        } else {
+            false
+        }
+    }
+}
+""").strip()
+
+# Простой класс для тестов, проверяющих только структуру ответа.
+# Общий код позволяет этим тестам использовать один результат из cached_analyze
+SIMPLE_CLASS_CODE = textwrap.dedent("""
+class SimpleClass {
+    fun test() {}
+}
+""").strip()
+
+# Контекст для USER_REPOSITORY_CODE: интерфейс и связанные классы
+USER_REPOSITORY_CONTEXT = dedent_context({
+    "Описание интерфейса": """
+    UserDao - основной интерфейс для работы с данными пользователей.
+    Предоставляет базовые операции CRUD для сущности User.
+    """,
+    "Интерфейс": """
+    interface UserDao {
+        // Поиск пользователя по ID
+        fun findById(id: String): User?
+        // Сохранение пользователя
+        fun save(user: User)
+        // Удаление пользователя
+        fun delete(id: String)
+    }
+    """,
+    "Модель данных": """
+    // Модель пользователя с основными полями
+    data class User(
+        val id: String,
+        val name: String,
+        val email: String
+    )
+    """
+})
+
+# Элементы, которые должны быть в документации USER_REPOSITORY_CODE с контекстом
+USER_REPOSITORY_DOC_ELEMENTS = [
+    "@property", "@constructor",
+    "UserDao", "User", "findById", "save",
+    "Внешние зависимости:", "Взаимодействие:"
+]
+
+# Контекст для PAYMENT_PROCESSOR_CODE: реализация интерфейса
+PAYMENT_PROCESSOR_CONTEXT = dedent_context({
+    "Реализация": """
+    class StripePaymentProcessor : PaymentProcessor {
+        override fun processPayment(amount: Double): Boolean {
+            return if (validatePayment(amount)) {
+                // Обработка платежа через Stripe API
+                stripeClient.charge(amount)
+                true
+            } else {
+                false
+            }
+        }
+
+        override fun validatePayment(amount: Double): Boolean {
+            return amount > 0 && amount < 1000000
+        }
+
+        private val stripeClient = StripeClient()
+    }
+    """
+})
+
+# Контекст для ORDER_PROCESSOR_CODE: используемые сервисы и модель заказа
+ORDER_PROCESSOR_CONTEXT = dedent_context({
+    "Сервис оплаты": """
+    interface PaymentService {
+        fun processPayment(amount: Double): Boolean
+    }
+    """,
+    "Сервис уведомлений": """
+    interface NotificationService {
+        fun notify(userId: String, message: String)
+    }
+    """,
+    "Модель заказа": """
+    data class Order(
+        val id: String,
+        val userId: String,
+        val total: Double,
+        val items: List<OrderItem>
+    )
+    """
+})
+
+# Элементы, которые должны быть в документации ORDER_PROCESSOR_CODE с контекстом
+ORDER_PROCESSOR_DOC_ELEMENTS = [
+    "OrderProcessor", "PaymentService", "NotificationService", "Order",
+    "Внешние зависимости:", "Взаимодействие:"
+]
+
+# Запросы тестов с контекстом, которые отправляются к модели в начале сессии:
+# генерация идет в фоне, пока выполняются предыдущие тесты. Тесты берут аргументы
+# cached_analyze из этого же словаря, поэтому предварительный запрос всегда совпадает.
+PREFETCH_PLAN = {
+    "test_documentation_with_context": dict(
+        code=USER_REPOSITORY_CODE, file_type="kotlin", context=USER_REPOSITORY_CONTEXT,
+        stop_markers=KDOC_DELIMITERS + USER_REPOSITORY_DOC_ELEMENTS),
+    "test_documentation_with_implementation_context": dict(
+        code=PAYMENT_PROCESSOR_CODE, file_type="kotlin", context=PAYMENT_PROCESSOR_CONTEXT),
+    "test_documentation_with_multiple_contexts": dict(
+        code=ORDER_PROCESSOR_CODE, file_type="kotlin", context=ORDER_PROCESSOR_CONTEXT,
+        stop_markers=KDOC_DELIMITERS + ORDER_PROCESSOR_DOC_ELEMENTS),
+}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def prefetch_requests(request, warm_model, cached_analyze):
+    """
+    Заранее отправляет запросы из PREFETCH_PLAN для тестов, выбранных к запуску.
+
+    При запуске через pytest-xdist каждый процесс собирает все тесты, но заранее
+    не знает, какие из них ему достанутся, поэтому предварительные запросы
+    отключены: тесты и так выполняются параллельно в разных процессах.
     """
-    result = ollama_client.analyze_code(code, "kotlin")
+    if XDIST_WORKER:
+        return
+    selected = {item.originalname for item in request.session.items
+                if not item.get_closest_marker("skip")}
+    for test_name, kwargs in PREFETCH_PLAN.items():
+        if test_name in selected:
+            cached_analyze.prefetch(**kwargs)
+
+
+@pytest.mark.skip
+def test_real_api_response(cached_analyze):
+    """Проверка структуры ответа модели"""
+    # Проверяется только структура ответа, поэтому полная генерация не нужна
+    result = cached_analyze(SIMPLE_CLASS_CODE, "kotlin", options={"num_predict": 8})
 
     assert isinstance(result, dict), "Ответ не является словарем"
     assert "documentation" in result, "Отсутствует документация"
     assert "metrics" in result, "Отсутствуют метрики"
-    assert "time" in result["metrics"], "Отсутствует время выполнения"
+    assert "total_duration" in result["metrics"], "Отсутствует время выполнения"
 
 
-@pytest.mark.skip
-def test_documentation_presence(ollama_client):
-    """Проверка наличия документации в ответе"""
-    code = """
-    class Logger {
-        fun log(msg: String) {}
-    }
-    """
-    result = ollama_client.analyze_code(code, "kotlin")
+# Фрагменты, документация для которых генерируется одним пакетным запросом
+BATCH_SNIPPETS = {
+    "simple": SIMPLE_CLASS_CODE,
+    "home_fragment": HOME_FRAGMENT_CODE,
+    "data_processor": DATA_PROCESSOR_CODE,
+}
+
+
+@pytest.fixture(scope="session")
+def doc_results(ollama_client):
+    """Документация для BATCH_SNIPPETS, полученная одним запросом к модели"""
+    return dict(zip(BATCH_SNIPPETS, ollama_client.analyze_code_batch(
+        [(code, "kotlin") for code in BATCH_SNIPPETS.values()])))
+
+
+# Фрагменты из BATCH_SNIPPETS и KDoc-аннотации, обязательные в их документации
+KDOC_CASES = [
+    pytest.param("simple", [], id="simple"),
+    pytest.param("home_fragment", ["@property", "@constructor", "@see"], id="home_fragment"),
+    pytest.param("data_processor", ["@property", "@constructor"], id="data_processor"),
+]
+
+
+@pytest.mark.parametrize("name, annotations", KDOC_CASES)
+def test_kdoc_structure(doc_results, name, annotations):
+    """Проверка структуры KDoc в документации фрагментов (в том числе реального Android кода)"""
+    result = doc_results[name]
 
     assert "documentation" in result, "Отсутствует поле documentation в ответе"
     doc = result["documentation"]
 
-    # Проверяем структуру KDoc
-    assert "/**" in doc, "Отсутствует начало KDoc блока"
-    assert "*/" in doc, "Отсутствует конец KDoc блока"
-    assert "@property" in doc or "@constructor" in doc, "Отсутствуют основные KDoc аннотации"
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
+    # Проверяем структуру KDoc и обязательные секции
+    assert_kdoc_contract(doc)
+    if annotations:
+        assert_all_in(doc, annotations)
+
+    # Проверка метрик
+    assert "metrics" in result, "Отсутствуют метрики"
+    metrics = result["metrics"]
+    # Длительности и счетчики токенов Ollama возвращает целыми числами
+    invalid = [key for key in ("total_duration", "total_tokens", "completion_tokens", "generation_speed")
+               if not metrics.get(key, 0) > 0]
+    assert not invalid, f"Некорректные метрики: {', '.join(invalid)} ({metrics})"
 
+    # Все фрагменты документированы одним запросом, без перехода к отдельным запросам
+    assert metrics.get("batch_size") == len(BATCH_SNIPPETS), \
+        f"Пакетный запрос не удался, фрагменты обработаны отдельно ({metrics})"
+    logging.info(f"Пакетный запрос: {len(BATCH_SNIPPETS)} фрагментов за "
+                 f"{metrics['total_duration'] / 1e9:.2f} сек")
 
-@pytest.mark.skip
-def test_real_android_code(ollama_client):
-    """Тест документирования реального Android кода на Kotlin."""
-    android_code = """
-    class HomeFragment : Fragment() {
-        private lateinit var binding: FragmentHomeBinding
-        private val viewModel: HomeViewModel by viewModels()
-        
-        override fun onCreateView(
-            inflater: LayoutInflater,
-            container: ViewGroup?,
-            savedInstanceState: Bundle?
-        ): View {
-            binding = FragmentHomeBinding.inflate(inflater, container, false)
-            return binding.root
-        }
-    }
+
+@functools.lru_cache(maxsize=None)
+def checklist_pattern(needles: Tuple[str, ...]) -> re.Pattern:
+    """Шаблон-альтернатива для набора подстрок, компилируется один раз на набор"""
+    # Более длинные подстроки ставим первыми, чтобы их не перекрывали короткие
+    return re.compile('|'.join(map(re.escape, sorted(needles, key=len, reverse=True))))
+
+
+def find_missing(doc: str, needles: List[str]) -> List[str]:
     """
-    result = ollama_client.analyze_code(android_code, "kotlin")
+    Возвращает подстроки, отсутствующие в документации, за один проход по тексту.
 
-    # Проверяем основные элементы документации
-    assert "documentation" in result, "Отсутствует документация"
-    doc = result["documentation"]
+    Args:
+        doc: Сгенерированная документация
+        needles: Подстроки, которые должны присутствовать в документации
 
-    # Проверяем структуру KDoc
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
-    assert "@property" in doc, "Отсутствует описание свойств"
-    assert "@constructor" in doc, "Отсутствует описание конструктора"
-    assert "@see" in doc, "Отсутствуют ссылки на связанные классы"
+    Returns:
+        Список отсутствующих подстрок в исходном порядке
+    """
+    found = set(checklist_pattern(tuple(needles)).findall(doc))
+    # Подстроки, перекрытые более длинными совпадениями, проверяем отдельно
+    return [needle for needle in needles if needle not in found and needle not in doc]
 
-    # Проверяем обязательные секции
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
 
+def find_present(doc: str, needles: List[str]) -> List[str]:
+    """
+    Возвращает подстроки, найденные в документации, за один проход по тексту.
 
-@pytest.mark.skip
-def test_real_analyze_code_kotlin(ollama_client):
-    """Тест анализа простого Kotlin класса"""
-    code = """
-    class DataProcessor {
-        private val cache = mutableMapOf<String, Int>()
-        
-        fun processData(data: List<String>): Map<String, Int> {
-            return data.groupBy { it }.mapValues { it.value.size }
-        }
-    }
+    Args:
+        doc: Сгенерированная документация
+        needles: Подстроки, которых не должно быть в документации
+
+    Returns:
+        Список найденных подстрок в порядке их появления
     """
-    result = ollama_client.analyze_code(code, "kotlin")
+    return list(dict.fromkeys(checklist_pattern(tuple(needles)).findall(doc)))
 
-    # Проверка наличия документации
-    assert "documentation" in result, "Отсутствует документация"
-    doc = result["documentation"]
 
-    # Проверка структуры KDoc
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
-    assert "@property" in doc, "Отсутствует описание свойств"
-    assert "@constructor" in doc, "Отсутствует описание конструктора"
+def kdoc_tokens_found(doc: str) -> set:
+    """Имена элементов KDOC_TOKENS, найденных в документации (один проход по тексту)"""
+    return {match.lastgroup for match in KDOC_TOKEN_RE.finditer(doc)}
 
-    # Проверка обязательных секций
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
 
-    # Проверка метрик
-    assert "metrics" in result, "Отсутствуют метрики"
-    assert result["metrics"]["time"] > 0, "Некорректное время выполнения"
-    assert result["metrics"]["tokens"] > 0, "Некорректное количество токенов"
-    assert result["metrics"]["speed"] > 0, "Некорректная скорость обработки"
+def assert_kdoc_contract(doc: str, required: frozenset = KDOC_REQUIRED,
+                         any_of: Tuple[frozenset, ...] = KDOC_ANY_OF,
+                         extra: List[str] = ()):
+    """
+    Проверяет структуру KDoc за один проход KDOC_TOKEN_RE по документации.
+
+    Args:
+        doc: Сгенерированная документация
+        required: Элементы KDOC_TOKENS, которые должны присутствовать все
+        any_of: Группы элементов, из каждой нужен хотя бы один
+        extra: Дополнительные подстроки (имена классов, методов и т.п.),
+            которые должны присутствовать в документации
+    """
+    assert KDOC_BLOCK_RE.search(doc), "Отсутствует KDoc блок"
+    found = kdoc_tokens_found(doc)
+    missing = required - found
+    assert not missing, f"В документации отсутствуют элементы KDoc: {', '.join(sorted(missing))}"
+    for group in any_of:
+        assert found & group, f"Отсутствуют KDoc аннотации: нужна хотя бы одна из {', '.join(sorted(group))}"
+    if extra:
+        assert_all_in(doc, extra)
+
+
+def assert_all_in(doc: str, needles: List[str]):
+    """
+    Проверяет наличие всех подстрок в документации за один проход по тексту.
+
+    Args:
+        doc: Сгенерированная документация
+        needles: Подстроки, которые должны присутствовать в документации
+    """
+    missing = find_missing(doc, needles)
+    assert not missing, f"В документации отсутствуют: {', '.join(missing)}"
 
 
 def log_context_info(context: Optional[Dict[str, str]] = None):
     """Логирует информацию о контексте в структурированном виде"""
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
     if not context:
         logging.info("Контекст: отсутствует")
         return
 
     logging.info("\nКонтекст:")
     for title, content in context.items():
-        if content and content.strip():
-            content_preview = content.strip()[:100] + "..." if len(content) > 100 else content
+        content = content.strip() if content else ""
+        if content:
+            content_preview = content[:100] + "..." if len(content) > 100 else content
             logging.info(f"- {title}:")
             logging.info(f"  {content_preview}")
 
 
-def log_metrics(metrics: Dict):
-    """Логирует метрики в структурированном виде"""
-    logging.info("\nМетрики выполнения:")
-    for key, value in metrics.items():
-        if isinstance(value, float):
-            logging.info(f"- {key}: {value:.2f}")
-        else:
-            logging.info(f"- {key}: {value}")
+@dataclass(frozen=True)
+class MetricsRecord:
+    """Метрики одного запроса к модели (поля совпадают с ключами OllamaClient._calculate_metrics)"""
+    total_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_duration: int = 0  # наносекунды
+    load_duration: int = 0
+    prompt_eval_duration: int = 0
+    generation_time: int = 0
+    generation_speed: float = 0.0  # токенов в секунду
+    time_per_token: float = 0.0  # миллисекунды
+    time_to_first_token: Optional[int] = None
+    batch_size: Optional[int] = None
+
+    @classmethod
+    def from_metrics(cls, metrics: Dict) -> "MetricsRecord":
+        """Создает запись из словаря metrics ответа, игнорируя неизвестные ключи"""
+        return cls(**{name: metrics[name] for name in cls.__dataclass_fields__ if name in metrics})
+
+    def format_plain(self) -> str:
+        """Форматирует метрики для лога; производные величины вычисляются один раз"""
+        lines = ["\nМетрики выполнения:"]
+        for name, value in asdict(self).items():
+            if value is not None:
+                lines.append(f"- {name}: {value:.2f}" if isinstance(value, float) else f"- {name}: {value}")
+
+        seconds = self.total_duration / 1e9  # наносекунды в секунды
+        tokens_per_second = self.total_tokens / seconds if seconds else 0.0
+        ms_per_token = 1000.0 / tokens_per_second if tokens_per_second else 0.0
+        lines.append(f"- Скорость обработки: {tokens_per_second:.2f} токенов/сек")
+        lines.append(f"- Среднее время на токен: {ms_per_token:.2f} мс")
+        return "\n".join(lines)
+
 
-    # Добавляем информацию о скорости обработки
-    if "total_duration" in metrics and "total_tokens" in metrics:
-        tokens_per_second = metrics["total_tokens"] / (
-                    metrics["total_duration"] / 1e9)  # наносекунды в секунды
-        logging.info(f"- Скорость обработки: {tokens_per_second:.2f} токенов/сек")
-        logging.info(
-            f"- Среднее время на токен: {(metrics['total_duration'] / 1e9 / metrics['total_tokens']) * 1000:.2f} мс")
+def log_metrics(metrics: Dict):
+    """Логирует метрики одной записью, только если уровень INFO включен"""
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        logging.info(MetricsRecord.from_metrics(metrics).format_plain())
 
 
 def log_model_info(model_info: Dict):
-    """Логирует информацию о модели в структурированном виде"""
-    logging.info("\nИнформация о модели:")
-    if 'model' in model_info:
-        logging.info(f"- Название: {model_info['model']}")
-    if 'parameters' in model_info:
-        logging.info("- Параметры:")
-        for param, value in model_info['parameters'].items():
-            logging.info(f"  • {param}: {value}")
-
-    # Добавляем информацию о размере модели и использовании памяти
-    if 'details' in model_info:
-        details = model_info['details']
-        if 'parameter_size' in details:
-            logging.info(f"- Размер модели: {details['parameter_size']}")
-        if 'memory_per_token' in details:
-            logging.info(f"- Память на токен: {details['memory_per_token']} байт")
-        if 'vocab_size' in details:
-            logging.info(f"- Размер словаря: {details['vocab_size']} токенов")
-
-
-def test_documentation_with_context(ollama_client, caplog):
+    """
+    Логирует сводку о модели одной записью.
+
+    Одна строка вместо отдельной записи на каждый параметр сокращает число
+    операций записи в лог; сводка собирается, только если уровень INFO включен.
+    """
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+
+    details = model_info.get('details') or {}
+    parameters = model_info.get('parameters')
+    if isinstance(parameters, dict):
+        parameters = ', '.join(f"{param}={value}" for param, value in parameters.items())
+    elif parameters:
+        # Ollama возвращает параметры строкой вида "name value" по одному на строку
+        parameters = ', '.join(' '.join(line.split()) for line in parameters.splitlines())
+
+    logging.info(
+        "Модель: %s | размер: %s | память на токен: %s | словарь: %s | параметры: %s",
+        model_info.get('model', 'нет данных'),
+        details.get('parameter_size', 'нет данных'),
+        details.get('memory_per_token', 'нет данных'),
+        details.get('vocab_size', 'нет данных'),
+        parameters or 'нет данных'
+    )
+
+
+def test_documentation_with_context(cached_analyze):
     """Тест генерации документации с учетом контекста"""
-    caplog.set_level(logging.INFO)
     logger = logging.getLogger(__name__)
     
     logger.info("Начало теста документации с контекстом интерфейсов")
     
+    request_args = PREFETCH_PLAN["test_documentation_with_context"]
     # Основной код для документирования
-    main_code = """
-    class UserRepository {
-        private val userDao: UserDao
-        
-        fun getUser(id: String): User? {
-            return userDao.findById(id)
-        }
-        
-        fun saveUser(user: User) {
-            userDao.save(user)
-        }
-    }
-    """
+    main_code = request_args["code"]
 
     # Контекст - интерфейс и связанные классы
-    context = {
-        "Описание интерфейса": """
-        UserDao - основной интерфейс для работы с данными пользователей.
-        Предоставляет базовые операции CRUD для сущности User.
-        """,
-        "Интерфейс": """
-        interface UserDao {
-            // Поиск пользователя по ID
-            fun findById(id: String): User?
-            // Сохранение пользователя
-            fun save(user: User)
-            // Удаление пользователя
-            fun delete(id: String)
-        }
-        """,
-        "Модель данных": """
-        // Модель пользователя с основными полями
-        data class User(
-            val id: String,
-            val name: String,
-            val email: String
-        )
-        """
-    }
+    context = request_args["context"]
 
     logger.info("\nАнализируемый код:")
-    logger.info(main_code)
+    logger.debug(main_code)
     
     logger.info("\nКонтекст:")
     for section, content in context.items():
         logger.info(f"\n{section}:")
-        logger.info(content)
+        logger.debug(content)
 
-    result = ollama_client.analyze_code(main_code, "kotlin", context=context)
+    # Генерация останавливается, как только получены все проверяемые элементы
+    result = cached_analyze(**request_args)
 
     assert "documentation" in result, "Отсутствует документация"
     doc = result["documentation"]
     
     logger.info("\nСгенерированная документация:")
-    logger.info(doc)
+    logger.debug(doc)
 
     # Проверяем структуру KDoc с учетом контекста
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
-    assert "@property" in doc, "Отсутствует описание свойств"
-    assert "@constructor" in doc, "Отсутствует описание конструктора"
-    assert "UserDao" in doc, "Отсутствует упоминание интерфейса из контекста"
-    assert "User" in doc, "Отсутствует упоминание модели данных"
-    assert "findById" in doc, "Отсутствует описание метода findById"
-    assert "save" in doc, "Отсутствует описание метода save"
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
+    assert_kdoc_contract(doc, extra=USER_REPOSITORY_DOC_ELEMENTS)
     
     logger.info("\nТест успешно завершен")
 
 
-def test_documentation_with_implementation_context(ollama_client, caplog):
+def test_documentation_with_implementation_context(cached_analyze):
     """Тест генерации документации с учетом контекста реализации"""
-    caplog.set_level(logging.INFO)
     logger = logging.getLogger(__name__)
     
     logger.info("Начало теста документации с контекстом реализации")
     
+    request_args = PREFETCH_PLAN["test_documentation_with_implementation_context"]
     # Интерфейс для документирования
-    interface_code = """
-    interface PaymentProcessor {
-        /**
-         * Обрабатывает платеж на указанную сумму
-         * @param amount сумма платежа
-         * @return true если платеж успешен, false в противном случае
-         */
-        fun processPayment(amount: Double): Boolean
-        
-        /**
-         * Проверяет валидность суммы платежа
-         * @param amount сумма для проверки
-         * @return true если сумма валидна, false в противном случае
-         */
-        fun validatePayment(amount: Double): Boolean
-    }
-    """
+    interface_code = request_args["code"]
     
     logger.info("\nАнализируемый код:")
-    logger.info(interface_code)
+    logger.debug(interface_code)
 
     # Контекст - реализация интерфейса
-    context = {
-        "Реализация": """
-        class StripePaymentProcessor : PaymentProcessor {
-            override fun processPayment(amount: Double): Boolean {
-                return if (validatePayment(amount)) {
-                    // Обработка платежа через Stripe API
-                    stripeClient.charge(amount)
-                    true
-                } else {
-                    false
-                }
-            }
-            
-            override fun validatePayment(amount: Double): Boolean {
-                return amount > 0 && amount < 1000000
-            }
-            
-            private val stripeClient = StripeClient()
-        }
-        """
-    }
+    context = request_args["context"]
     
     logger.info("\nКонтекст реализации:")
     for section, content in context.items():
         logger.info(f"\n{section}:")
-        logger.info(content)
+        logger.debug(content)
 
-    result = ollama_client.analyze_code(interface_code, "kotlin", context=context)
+    result = cached_analyze(**request_args)
 
     assert "documentation" in result, "Отсутствует документация"
     doc = result["documentation"]
     
     logger.info("\nСгенерированная документация:")
-    logger.info(doc)
+    logger.debug(doc)
 
-    # Проверяем только базовую структуру KDoc и наличие основных элементов
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
+    # Проверяем базовую структуру KDoc и обязательные секции (у интерфейса нет свойств)
+    assert_kdoc_contract(doc, any_of=())
     
     # Проверяем наличие хотя бы одного из методов
     methods = ["processPayment", "validatePayment"]
     assert any(method in doc for method in methods), "Отсутствует описание методов интерфейса"
     
     # Проверяем наличие хотя бы одного упоминания о платежах
+    # (документация приводится к нижнему регистру один раз, а не для каждого термина)
+    doc_lower = doc.lower()
     payment_terms = ["payment", "платеж", "сумма", "amount"]
-    assert any(term.lower() in doc.lower() for term in payment_terms), "Отсутствует описание работы с платежами"
-    
-    # Проверяем обязательные секции
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
+    assert any(term in doc_lower for term in payment_terms), "Отсутствует описание работы с платежами"
     
     logger.info("\nТест успешно завершен")
 
 
-@pytest.mark.skip
-def test_context_size_calculation(ollama_client):
-    """Тест корректности расчета размера контекста"""
-    # Контекст с фиксированным размером
-    context = {
-        "Файл1": "A" * 100,  # 100 байт
-        "Файл2": "B" * 100  # 100 байт
-    }
-
-    code = "class Test {}"
-    result = ollama_client.analyze_code(code, "kotlin", context=context)
-
-    # Проверяем метрики
-    assert "metrics" in result, "Отсутствуют метрики"
-    metrics = result["metrics"]
-
-    # Проверяем базовые метрики
-    assert metrics["time"] > 0, "Некорректное время выполнения"
-    assert metrics["tokens"] > 0, "Некорректное количество токенов"
-    assert metrics["prompt_tokens"] > 0, "Некорректное количество токенов промпта"
-    assert metrics["completion_tokens"] >= 0, "Некорректное количество токенов ответа"
-    assert metrics["speed"] > 0, "Некорректная скорость обработки"
-
-
-def test_documentation_with_multiple_contexts(ollama_client, caplog):
+def test_documentation_with_multiple_contexts(cached_analyze):
     """Тест генерации документации с множественным контекстом"""
-    caplog.set_level(logging.INFO)
     logger = logging.getLogger(__name__)
     
     logger.info("Начало теста документации с множественным контекстом")
     
-    main_code = """
-    class OrderProcessor {
-        private val paymentService: PaymentService
-        private val notificationService: NotificationService
-        
-        fun processOrder(order: Order): Boolean {
-            return if (paymentService.processPayment(order.total)) {
-                notificationService.notify(order.userId, "Заказ оплачен")
-                true
-            } else {
-                false
-            }
-        }
-    }
-    """
+    request_args = PREFETCH_PLAN["test_documentation_with_multiple_contexts"]
+    main_code = request_args["code"]
     
     logger.info("\nАнализируемый код:")
-    logger.info(main_code)
+    logger.debug(main_code)
 
-    context = {
-        "Сервис оплаты": """
-        interface PaymentService {
-            fun processPayment(amount: Double): Boolean
-        }
-        """,
-        "Сервис уведомлений": """
-        interface NotificationService {
-            fun notify(userId: String, message: String)
-        }
-        """,
-        "Модель заказа": """
-        data class Order(
-            val id: String,
-            val userId: String,
-            val total: Double,
-            val items: List<OrderItem>
-        )
-        """
-    }
+    context = request_args["context"]
     
     logger.info("\nКонтексты:")
     for section, content in context.items():
         logger.info(f"\n{section}:")
-        logger.info(content)
+        logger.debug(content)
 
-    result = ollama_client.analyze_code(main_code, "kotlin", context=context)
+    # Генерация останавливается, как только получены все проверяемые элементы
+    result = cached_analyze(**request_args)
 
     assert "documentation" in result, "Отсутствует документация"
     doc = result["documentation"]
     
     logger.info("\nСгенерированная документация:")
-    logger.info(doc)
+    logger.debug(doc)
 
     # Проверяем структуру KDoc
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
-    assert "OrderProcessor" in doc, "Отсутствует название основного класса"
-    assert "PaymentService" in doc, "Отсутствует упоминание PaymentService"
-    assert "NotificationService" in doc, "Отсутствует упоминание NotificationService"
-    assert "Order" in doc, "Отсутствует упоминание Order"
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
+    assert_kdoc_contract(doc, any_of=(), extra=ORDER_PROCESSOR_DOC_ELEMENTS)
     
     logger.info("\nТест успешно завершен")
 
 
 @pytest.mark.skip
-def test_documentation_with_empty_context(ollama_client):
+@pytest.mark.parametrize("empty_context", [
+    pytest.param(None, id="none"),  # Нет контекста
+    pytest.param({}, id="empty_dict"),  # Пустой словарь
+    pytest.param({"Context": ""}, id="empty_str"),  # Пустая строка
+    pytest.param({"Context": None}, id="none_value"),  # None значение
+    pytest.param({"Context": "   "}, id="whitespace"),  # Только пробелы
+])
+def test_documentation_with_empty_context(cached_analyze, empty_context):
     """Тест генерации документации с пустым контекстом"""
-    code = """
-    class SimpleClass {
-        fun test() {}
-    }
-    """
-
-    # Проверяем разные варианты пустого контекста
-    empty_contexts = [
-        None,  # Нет контекста
-        {},  # Пустой словарь
-        {"Context": ""},  # Пустая строка
-        {"Context": None},  # None значение
-        {"Context": "   "}  # Только пробелы
-    ]
+    result = cached_analyze(SIMPLE_CLASS_CODE, "kotlin", context=empty_context)
 
-    for empty_context in empty_contexts:
-        result = ollama_client.analyze_code(code, "kotlin", context=empty_context)
-
-        # Проверяем базовую структуру ответа
-        assert "documentation" in result, "Отсутствует документация"
-        assert "metrics" in result, "Отсутствуют метрики"
-
-        doc = result["documentation"]
+    # Проверяем базовую структуру ответа
+    assert "documentation" in result, "Отсутствует документация"
+    assert "metrics" in result, "Отсутствуют метрики"
 
-        # Проверяем структуру KDoc
-        assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
-        assert "@constructor" in doc, "Отсутствует описание конструктора"
+    doc = result["documentation"]
 
-        # Проверяем обязательные секции
-        assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-        assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
+    # Проверяем структуру KDoc, описание конструктора и обязательные секции
+    assert_kdoc_contract(doc, required=KDOC_REQUIRED | {"constructor"}, any_of=())
 
 
 @pytest.mark.skip
-def test_context_parameter_validation(ollama_client):
+@pytest.mark.parametrize("context", [
+    pytest.param(None, id="none"),
+    pytest.param({}, id="empty_dict"),
+    # Некорректные значения в контексте
+    pytest.param({"Файл1": None, "Файл2": "", "Файл3": "   "}, id="invalid_values"),
+])
+def test_context_parameter_validation(cached_analyze, context):
     """Тест валидации параметров контекста"""
-    code = """
-    class TestClass {
-        fun test() {}
+    result = cached_analyze(SIMPLE_CLASS_CODE, "kotlin", context=context)
+    assert "documentation" in result, f"Отсутствует документация при context={context!r}"
+
+
+# Код для тестов качества документации
+CALCULATOR_CODE = textwrap.dedent("""
+class Calculator {
+    fun calculate(a: Int, b: Int): Int {
+        return a + b
+    }
+    
+    fun multiply(a: Int, b: Int): Int {
+        return a * b
+    }
+}
+""").strip()
+
+LAMBDA_CALCULATOR_CODE = textwrap.dedent("""
+class Calculator {
+    fun processNumbers(numbers: Array<Int>): List<Int> {
+        return numbers
+            .filter { it > 0 }                    // Фильтрация положительных чисел
+            .map { it * 2 }                       // Умножение каждого числа на 2
+            .takeWhile { it < 100 }              // Взять числа меньше 100
     }
+    
+    fun calculateSum(a: Int, b: Int): Int = a + b  // Лямбда для сложения
+}
+""").strip()
+
+LAMBDA_CALCULATOR_CONTEXT = dedent_context({
+    "Описание работы": """
+    Обработка массива с использованием лямбда-выражений:
+    1. Фильтрация элементов через лямбда-функцию filter
+    2. Трансформация данных через лямбда-функцию map
+    3. Ограничение выборки через лямбда-функцию takeWhile
+    4. Использование однострочной лямбда-функции для calculateSum
+    """,
+    "Особенности реализации": """
+    Ключевые особенности:
+    - Активное использование лямбда-выражений для обработки коллекций
+    - Цепочки вызовов с лямбда-функциями (filter, map, takeWhile)
+    - Однострочные лямбда-выражения для простых операций
+    - Безопасная работа с массивами через функции-расширения
     """
+})
 
-    # Тест с None
-    result1 = ollama_client.analyze_code(code, "kotlin", context=None)
-    assert "documentation" in result1, "Отсутствует документация при context=None"
 
-    # Тест с пустым словарем
-    result2 = ollama_client.analyze_code(code, "kotlin", context={})
-    assert "documentation" in result2, "Отсутствует документация при пустом контексте"
+@pytest.fixture(scope="module")
+def quality_results(ollama_client):
+    """
+    Параллельно генерирует документацию для тестов качества (без контекста и с контекстом).
 
-    # Тест с некорректными значениями в контексте
-    invalid_context = {
-        "Файл1": None,
-        "Файл2": "",
-        "Файл3": "   ",
-    }
-    result3 = ollama_client.analyze_code(code, "kotlin", context=invalid_context)
-    assert "documentation" in result3, "Отсутствует документация при некорректном контексте"
+    Оба запроса отправляются одним пакетом через analyze_codes, поэтому время
+    выполнения пары тестов определяется самым долгим запросом, а не их суммой.
+    """
+    without_context, with_context = ollama_client.analyze_codes([
+        (CALCULATOR_CODE, "kotlin", None),
+        (LAMBDA_CALCULATOR_CODE, "kotlin", LAMBDA_CALCULATOR_CONTEXT),
+    ])
+    return {"without_context": without_context, "with_context": with_context}
 
 
-def test_documentation_quality_without_context(ollama_client, caplog):
+@pytest.mark.verbose
+@pytest.mark.usefixtures("heavy_backend")
+def test_documentation_quality_without_context(quality_results):
     """Тест качества документации без контекстной информации"""
-    caplog.set_level(logging.INFO)
     logger = logging.getLogger(__name__)
     
     logger.info("Начало теста качества документации без контекста")
     
-    code = """
-    class Calculator {
-        fun calculate(a: Int, b: Int): Int {
-            return a + b
-        }
-        
-        fun multiply(a: Int, b: Int): Int {
-            return a * b
-        }
-    }
-    """
+    code = CALCULATOR_CODE
     
     logger.info("\nАнализируемый код:")
-    logger.info(code)
+    logger.debug(code)
 
-    result = ollama_client.analyze_code(code, "kotlin")
+    result = quality_results["without_context"]
 
     assert "documentation" in result, "Отсутствует документация"
     doc = result["documentation"]
     
     logger.info("\nСгенерированная документация:")
-    logger.info(doc)
+    logger.debug(doc)
 
     # Проверяем базовую структуру KDoc
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
-    assert "Calculator" in doc, "Отсутствует название класса"
-    assert "calculate" in doc, "Отсутствует документация метода calculate"
-    assert "multiply" in doc, "Отсутствует документация метода multiply"
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
+    assert_kdoc_contract(doc, any_of=(), extra=["Calculator", "calculate", "multiply"])
     
     logger.info("\nТест успешно завершен")
 
 
-def test_documentation_quality_with_context(ollama_client, caplog):
+@pytest.mark.verbose
+@pytest.mark.usefixtures("heavy_backend")
+def test_documentation_quality_with_context(quality_results):
     """Тест качества документации с контекстной информацией"""
-    caplog.set_level(logging.INFO)
     logger = logging.getLogger(__name__)
     
     logger.info("Начало теста документации с контекстом лямбда-выражений")
     
-    code = """
-    class Calculator {
-        fun processNumbers(numbers: Array<Int>): List<Int> {
-            return numbers
-                .filter { it > 0 }                    // Фильтрация положительных чисел
-                .map { it * 2 }                       // Умножение каждого числа на 2
-                .takeWhile { it < 100 }              // Взять числа меньше 100
-        }
-        
-        fun calculateSum(a: Int, b: Int): Int = a + b  // Лямбда для сложения
-    }
-    """
+    code = LAMBDA_CALCULATOR_CODE
     
     logger.info("\nАнализируемый код:")
-    logger.info(code)
-
-    context = {
-        "Описание работы": """
-        Обработка массива с использованием лямбда-выражений:
-        1. Фильтрация элементов через лямбда-функцию filter
-        2. Трансформация данных через лямбда-функцию map
-        3. Ограничение выборки через лямбда-функцию takeWhile
-        4. Использование однострочной лямбда-функции для calculateSum
-        """,
-        "Особенности реализации": """
-        Ключевые особенности:
-        - Активное использование лямбда-выражений для обработки коллекций
-        - Цепочки вызовов с лямбда-функциями (filter, map, takeWhile)
-        - Однострочные лямбда-выражения для простых операций
-        - Безопасная работа с массивами через функции-расширения
-        """
-    }
+    logger.debug(code)
+
+    context = LAMBDA_CALCULATOR_CONTEXT
     
     logger.info("\nКонтекст для анализа:")
     for section, content in context.items():
         logger.info(f"\n{section}:")
-        logger.info(content)
+        logger.debug(content)
 
-    result = ollama_client.analyze_code(code, "kotlin", context=context)
+    result = quality_results["with_context"]
     
     assert "documentation" in result, "Отсутствует документация"
     doc = result["documentation"]
     
     logger.info("\nСгенерированная документация:")
-    logger.info(doc)
+    logger.debug(doc)
 
-    # Проверяем только базовую структуру KDoc и основные элементы
-    assert "/**" in doc and "*/" in doc, "Неверный формат KDoc"
+    # Проверяем базовую структуру KDoc и обязательные секции
+    assert_kdoc_contract(doc, any_of=())
     
     # Проверяем наличие хотя бы одного упоминания о ключевых концепциях
     key_concepts = ["Array", "List", "filter", "map", "takeWhile"]
     assert any(concept in doc for concept in key_concepts), "Отсутствует описание основных концепций"
     
-    # Проверяем обязательные секции
-    assert "Внешние зависимости:" in doc, "Отсутствует секция внешних зависимостей"
-    assert "Взаимодействие:" in doc, "Отсутствует секция взаимодействия"
-    
     logger.info("\nТест успешно завершен")
 
 
@@ -664,10 +1029,10 @@ def log_test_name(request):
     """Автоматически логирует название каждого теста"""
     log_test_separator(request.node.name)
 
-def run_test_with_logging(test_func, ollama_client, caplog) -> bool:
-    """Запускает тест и возвращает результат его выполнения"""
+def run_test_with_logging(test_func, *args) -> bool:
+    """Запускает тест с переданными аргументами и возвращает результат его выполнения"""
     try:
-        test_func(ollama_client, caplog)
+        test_func(*args)
         return True
     except AssertionError as e:
         logging.error(f"Тест {test_func.__name__} не прошел: {str(e)}")
@@ -680,13 +1045,12 @@ def clear_logs():
     """Очистка лог-файлов перед запуском тестов"""
     log_files = [
         "ollama_client.log",
-        "stability_test.log"
+        STABILITY_LOG_FILE
     ]
     
     for log_file in log_files:
         try:
-            with open(log_file, 'w', encoding='utf-8') as f:
-                f.write("")
+            Path(log_file).write_bytes(b"")
             logging.info(f"Лог-файл очищен: {log_file}")
         except Exception as e:
             logging.warning(f"Не удалось очистить лог-файл {log_file}: {e}")
@@ -779,15 +1143,22 @@ def log_performance_summary(logger: logging.Logger, all_performance_metrics: lis
     logger.info("2. Документирование критических частей кода")
     logger.info("3. Обновление документации при существенных изменениях")
     
-def test_stability(ollama_client, caplog):
+
+@pytest.mark.slow
+@pytest.mark.usefixtures("heavy_backend")
+def test_stability(ollama_http_client, android_sample):
     """Тест стабильности выполнения основных тестов"""
+    # Тест измеряет повторные запросы к модели, поэтому кэш ответов не используется
+    ollama_client = OllamaClient(client=ollama_http_client, keep_alive=MODEL_KEEP_ALIVE,
+                                 timeout=OLLAMA_TIMEOUT)
+
     # Очищаем логи перед запуском
     clear_logs()
 
     clear_cache()
 
     # Настраиваем логирование в файл
-    log_file = "stability_test.log"
+    log_file = STABILITY_LOG_FILE
 
     # Форматтер для файла
     file_formatter = logging.Formatter(
@@ -866,7 +1237,7 @@ def test_stability(ollama_client, caplog):
                 test_code = inspect.getsource(test)
                 code_metrics = calculate_code_metrics(test_code)
 
-                success = run_test_with_logging(test, ollama_client, caplog)
+                success = run_test_with_logging(test, ollama_client, android_sample)
                 execution_time = time.time() - start_time
 
                 if success:
@@ -917,202 +1288,93 @@ def test_stability(ollama_client, caplog):
         abs_path = os.path.abspath(log_file)
         print(f"\nЛоги теста стабильности сохранены в: {abs_path}")
 
-def test_android_home_documentation(ollama_client, caplog):
-    """Тест документирования реального Android кода с контекстом приложения"""
-    caplog.set_level(logging.INFO)
-    logger = logging.getLogger(__name__)
-    
-    logger.info("Начало теста документирования Android-кода")
-    
-    # Основной код фрагмента
-    fragment_code = """
-    class HomeFragment : Fragment() {
-        private var _binding: FragmentHomeBinding? = null
-        private val binding get() = _binding!!
-
-        @AssistedFactory
-        internal interface ViewModelFactory {
-            fun create(): HomeViewModel
-        }
 
-        @Inject
-        internal lateinit var viewModelFactory: ViewModelFactory
-        private val viewModel: HomeViewModel by viewModelFactory { viewModelFactory.create() }
-
-        private var searchView: SearchView? = null
-        private var searchMenuItem: MenuItem? = null
+# Контекст приложения для документирования Android-кода
+ANDROID_APP_CONTEXT = dedent_context({
+    "Описание приложения": """
+    AI Prompt Master
+    Бесплатный инструмент для создания, улучшения и обмена промптами ИИ
+
+    О проекте
+    AI Prompt Master — приложение для Android, которое помогает пользователям:
+
+    Автоматически улучшать запросы для ИИ-моделей (MidJourney, ChatGPT, Stable Diffusion и др.).
+    Создавать промпты за секунды с помощью конструктора из готовых блоков.
+    Делиться идеями в сообществе, находить вдохновение и учиться у других.
+    Бесплатно. Без рекламы.
+    """,
+    "Ключевые функции": """
+    🔥 AI-анализ промптов
+    Введите текст — получите советы по добавлению деталей, исправлению ошибок и адаптации под конкретный ИИ.
+
+    🎨 Конструктор запросов
+    Собирайте промпты из блоков: «Стиль: киберпанк», «Качество: 8K», «Настроение: мрачное».
+
+    👥 Сообщество
+    Публикуйте свои лучшие работы, голосуйте за чужие идеи, участвуйте в челленджах.
+
+    🔒 Безопасность
+    Все данные хранятся локально. Никаких облаков или скрытой аналитики.
+    """,
+    "Уникальность": """
+    Нет аналогов с открытым исходным кодом и бесплатным функционалом.
+    Сообщество вместо монетизации: Никаких платных подписок — только добровольные донаты.
+    Для всех: Подходит как профессионалам, так и новичкам.
+    """,
+    "Библиотека промптов": """
+    📚 AI Prompts Repository - Открытая библиотека промптов, которая содержит:
+    - Структурированную коллекцию промптов для различных AI-моделей
+    - Готовые шаблоны для разных задач
+    - Примеры эффективных запросов
+    - Возможность внести свой вклад в развитие базы промптов
+    - Скрипт для визуального добавления и использования промптов
+    """,
+    "Архитектура": """
+    - MVVM архитектура
+    - Dagger для внедрения зависимостей
+    - Kotlin Coroutines и Flow для асинхронных операций
+    - Paging 3 для постраничной загрузки
+    - View Binding для работы с UI
+    """,
+    "Основные компоненты": """
+    - Fragment для отображения UI
+    - ViewModel для бизнес-логики
+    - Adapter для отображения списка промптов
+    - Repository для работы с данными
+    - Interactor для бизнес-правил
+    """
+})
 
-        private val promptsAdapter = PromptsAdapter(
-            onPromptClick = { showPromptDetails(it) },
-            onPromptLongClick = { showPromptOptions(it) },
-            onFavoriteClick = { prompt ->
-                viewModel.toggleFavorite(prompt.id)
-            }
-        )
 
-        override fun onViewCreated(view: View, savedInstanceState: Bundle?) {
-            super.onViewCreated(view, savedInstanceState)
-            initMenu()
-            setupViews()
-            observeViewModel()
-        }
+@pytest.fixture(scope="session")
+def android_sample() -> Tuple[str, str]:
+    """Код HomeFragment и HomeViewModel из ресурсов, читается один раз за сессию"""
+    return load_resource("HomeFragment.kt"), load_resource("HomeViewModel.kt")
 
-        private fun setupViews() {
-            with(binding) {
-                recyclerView.apply {
-                    adapter = promptsAdapter
-                }
-                swipeRefresh.setOnRefreshListener {
-                    promptsAdapter.refresh()
-                }
-                chipGroupFilters.setOnCheckedChangeListener { _, checkedId ->
-                    when (checkedId) {
-                        R.id.chipAll -> viewModel.search()
-                        R.id.chipFavorites -> viewModel.search(status = "favorite")
-                    }
-                }
-            }
-        }
 
-        private fun observeViewModel() {
-            launchWhenCreated {
-                viewModel.promptsFlow.collectLatest { pagingData ->
-                    promptsAdapter.submitData(pagingData)
-                }
-            }
-        }
-    }
-    """
+@pytest.mark.verbose
+@pytest.mark.slow
+@pytest.mark.usefixtures("heavy_backend")
+def test_android_home_documentation(ollama_client, android_sample):
+    """Тест документирования реального Android кода с контекстом приложения"""
+    logger = logging.getLogger(__name__)
+    
+    logger.info("Начало теста документирования Android-кода")
+    
+    fragment_code, viewmodel_code = android_sample
     
     logger.info("\nАнализируемый код фрагмента:")
-    logger.info(fragment_code)
-
-    # Код ViewModel
-    viewmodel_code = """
-    class HomeViewModel @AssistedInject constructor(
-        private val interactor: IPromptsInteractor,
-    ) : ViewModel() {
-        private val _error = MutableSharedFlow<IWrappedString>()
-        val error = _error.asSharedFlow()
-
-        private val _uiState = MutableStateFlow<UiState>(UiState.Initial)
-        val uiState = _uiState.asStateFlow()
-
-        val promptsFlow: Flow<PagingData<Prompt>> = listOf(
-            trigger.map { UiAction.Refresh },
-            actionStateFlow
-                .distinctUntilChanged()
-                .debounce(350)
-        )
-            .merge()
-            .onStart { emit(UiAction.Refresh) }
-            .flatMapLatest { action ->
-                createPager(_searchState.value).flow
-            }
-            .cachedIn(viewModelScope)
-
-        fun handleLoadStates(loadStates: CombinedLoadStates, itemCount: Int) {
-            val isLoading = loadStates.refresh is LoadState.Loading
-            val isError = loadStates.refresh is LoadState.Error
-            val isEmpty = loadStates.refresh is LoadState.NotLoading && itemCount == 0
-
-            _uiState.value = when {
-                isError -> UiState.Error((loadStates.refresh as LoadState.Error).error)
-                isLoading -> UiState.Loading
-                isEmpty -> UiState.Empty
-                else -> UiState.Content
-            }
-        }
-
-        fun synchronize() {
-            viewModelScope.launch {
-                _uiState.value = UiState.SyncInProgress
-                try {
-                    when (val result = interactor.synchronize()) {
-                        is SyncResult.Success -> {
-                            _uiState.value = UiState.SyncSuccess(result.updatedPrompts.size)
-                            loadPrompts(resetAll = true)
-                        }
-                        is SyncResult.Error -> {
-                            _uiState.value = UiState.SyncError
-                            _error.tryEmit(ResourceString(R.string.sync_error, result.message))
-                        }
-                        is SyncResult.Conflicts -> {
-                            _uiState.value = UiState.SyncConflicts(result.conflicts)
-                        }
-                    }
-                } catch (e: Exception) {
-                    handleError(e)
-                    _uiState.value = UiState.SyncError
-                }
-            }
-        }
-    }
-    """
+    logger.debug(fragment_code)
     
     logger.info("\nАнализируемый код ViewModel:")
-    logger.info(viewmodel_code)
-
-    # Контекст приложения
-    context = {
-        "Описание приложения": """
-        AI Prompt Master
-        Бесплатный инструмент для создания, улучшения и обмена промптами ИИ
-
-        О проекте
-        AI Prompt Master — приложение для Android, которое помогает пользователям:
-
-        Автоматически улучшать запросы для ИИ-моделей (MidJourney, ChatGPT, Stable Diffusion и др.).
-        Создавать промпты за секунды с помощью конструктора из готовых блоков.
-        Делиться идеями в сообществе, находить вдохновение и учиться у других.
-        Бесплатно. Без рекламы.
-        """,
-        "Ключевые функции": """
-        🔥 AI-анализ промптов
-        Введите текст — получите советы по добавлению деталей, исправлению ошибок и адаптации под конкретный ИИ.
-
-        🎨 Конструктор запросов
-        Собирайте промпты из блоков: «Стиль: киберпанк», «Качество: 8K», «Настроение: мрачное».
-
-        👥 Сообщество
-        Публикуйте свои лучшие работы, голосуйте за чужие идеи, участвуйте в челленджах.
-
-        🔒 Безопасность
-        Все данные хранятся локально. Никаких облаков или скрытой аналитики.
-        """,
-        "Уникальность": """
-        Нет аналогов с открытым исходным кодом и бесплатным функционалом.
-        Сообщество вместо монетизации: Никаких платных подписок — только добровольные донаты.
-        Для всех: Подходит как профессионалам, так и новичкам.
-        """,
-        "Библиотека промптов": """
-        📚 AI Prompts Repository - Открытая библиотека промптов, которая содержит:
-        - Структурированную коллекцию промптов для различных AI-моделей
-        - Готовые шаблоны для разных задач
-        - Примеры эффективных запросов
-        - Возможность внести свой вклад в развитие базы промптов
-        - Скрипт для визуального добавления и использования промптов
-        """,
-        "Архитектура": """
-        - MVVM архитектура
-        - Dagger для внедрения зависимостей
-        - Kotlin Coroutines и Flow для асинхронных операций
-        - Paging 3 для постраничной загрузки
-        - View Binding для работы с UI
-        """,
-        "Основные компоненты": """
-        - Fragment для отображения UI
-        - ViewModel для бизнес-логики
-        - Adapter для отображения списка промптов
-        - Repository для работы с данными
-        - Interactor для бизнес-правил
-        """
-    }
+    logger.debug(viewmodel_code)
+
+    context = ANDROID_APP_CONTEXT
     
     logger.info("\nКонтекст приложения:")
     for section, content in context.items():
         logger.info(f"\n{section}:")
-        logger.info(content)
+        logger.debug(content)
 
     try:
         # Анализируем Fragment
@@ -1123,10 +1385,10 @@ def test_android_home_documentation(ollama_client, caplog):
         fragment_doc = fragment_result["documentation"]
         
         logger.info("\nСгенерированная документация для Fragment:")
-        logger.info(fragment_doc)
+        logger.debug(fragment_doc)
 
         # Проверяем документацию Fragment с более гибкими проверками
-        assert "/**" in fragment_doc and "*/" in fragment_doc, "Неверный формат KDoc"
+        assert KDOC_BLOCK_RE.search(fragment_doc), "Неверный формат KDoc"
         
         # Проверяем наличие основных элементов с учетом возможных вариаций
         required_elements = [
@@ -1137,7 +1399,7 @@ def test_android_home_documentation(ollama_client, caplog):
             "Взаимодействие"
         ]
         
-        missing_elements = [elem for elem in required_elements if elem not in fragment_doc]
+        missing_elements = find_missing(fragment_doc, required_elements)
         if missing_elements:
             logger.warning(f"Отсутствующие элементы в документации Fragment: {', '.join(missing_elements)}")
             # Не прерываем тест, а только логируем предупреждение
@@ -1150,10 +1412,10 @@ def test_android_home_documentation(ollama_client, caplog):
         viewmodel_doc = viewmodel_result["documentation"]
         
         logger.info("\nСгенерированная документация для ViewModel:")
-        logger.info(viewmodel_doc)
+        logger.debug(viewmodel_doc)
 
         # Проверяем документацию ViewModel с более гибкими проверками
-        assert "/**" in viewmodel_doc and "*/" in viewmodel_doc, "Неверный формат KDoc"
+        assert KDOC_BLOCK_RE.search(viewmodel_doc), "Неверный формат KDoc"
         
         # Проверяем наличие основных элементов с учетом возможных вариаций
         required_elements = [
@@ -1164,7 +1426,7 @@ def test_android_home_documentation(ollama_client, caplog):
             "Взаимодействие"
         ]
         
-        missing_elements = [elem for elem in required_elements if elem not in viewmodel_doc]
+        missing_elements = find_missing(viewmodel_doc, required_elements)
         if missing_elements:
             logger.warning(f"Отсутствующие элементы в документации ViewModel: {', '.join(missing_elements)}")
             # Не прерываем тест, а только логируем предупреждение
@@ -1196,17 +1458,17 @@ def test_android_home_documentation(ollama_client, caplog):
         ]
         
         # Проверяем отсутствие фрагментов исходного кода
-        for indicator in code_indicators_fragment:
-            assert indicator not in fragment_doc, f"Документация Fragment содержит исходный код: {indicator}"
-            
-        for indicator in code_indicators_viewmodel:
-            assert indicator not in viewmodel_doc, f"Документация ViewModel содержит исходный код: {indicator}"
+        leaked_code = find_present(fragment_doc, code_indicators_fragment)
+        assert not leaked_code, f"Документация Fragment содержит исходный код: {', '.join(leaked_code)}"
+
+        leaked_code = find_present(viewmodel_doc, code_indicators_viewmodel)
+        assert not leaked_code, f"Документация ViewModel содержит исходный код: {', '.join(leaked_code)}"
         
-        fragment_terms = [term for term in fragment_android_terms if term not in fragment_doc]
+        fragment_terms = find_missing(fragment_doc, fragment_android_terms)
         if fragment_terms:
             logger.warning(f"Отсутствующие Android-термины в документации Fragment: {', '.join(fragment_terms)}")
         
-        viewmodel_terms = [term for term in viewmodel_android_terms if term not in viewmodel_doc]
+        viewmodel_terms = find_missing(viewmodel_doc, viewmodel_android_terms)
         if viewmodel_terms:
             logger.warning(f"Отсутствующие Android-термины в документации ViewModel: {', '.join(viewmodel_terms)}")
         
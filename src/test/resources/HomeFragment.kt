@@ -0,0 +1,56 @@
+class HomeFragment : Fragment() {
+    private var _binding: FragmentHomeBinding? = null
+    private val binding get() = _binding!!
+
+    @AssistedFactory
+    internal interface ViewModelFactory {
+        fun create(): HomeViewModel
+    }
+
+    @Inject
+    internal lateinit var viewModelFactory: ViewModelFactory
+    private val viewModel: HomeViewModel by viewModelFactory { viewModelFactory.create() }
+
+    private var searchView: SearchView? = null
+    private var searchMenuItem: MenuItem? = null
+
+    private val promptsAdapter = PromptsAdapter(
+        onPromptClick = { showPromptDetails(it) },
+        onPromptLongClick = { showPromptOptions(it) },
+        onFavoriteClick = { prompt ->
+            viewModel.toggleFavorite(prompt.id)
+        }
+    )
+
+    override fun onViewCreated(view: View, savedInstanceState: Bundle?) {
+        super.onViewCreated(view, savedInstanceState)
+        initMenu()
+        setupViews()
+        observeViewModel()
+    }
+
+    private fun setupViews() {
+        with(binding) {
+            recyclerView.apply {
+                adapter = promptsAdapter
+            }
+            swipeRefresh.setOnRefreshListener {
+                promptsAdapter.refresh()
+            }
+            chipGroupFilters.setOnCheckedChangeListener { _, checkedId ->
+                when (checkedId) {
+                    R.id.chipAll -> viewModel.search()
+                    R.id.chipFavorites -> viewModel.search(status = "favorite")
+                }
+            }
+        }
+    }
+
+    private fun observeViewModel() {
+        launchWhenCreated {
+            viewModel.promptsFlow.collectLatest { pagingData ->
+                promptsAdapter.submitData(pagingData)
+            }
+        }
+    }
+}
@@ -0,0 +1,59 @@
+class HomeViewModel @AssistedInject constructor(
+    private val interactor: IPromptsInteractor,
+) : ViewModel() {
+    private val _error = MutableSharedFlow<IWrappedString>()
+    val error = _error.asSharedFlow()
+
+    private val _uiState = MutableStateFlow<UiState>(UiState.Initial)
+    val uiState = _uiState.asStateFlow()
+
+    val promptsFlow: Flow<PagingData<Prompt>> = listOf(
+        trigger.map { UiAction.Refresh },
+        actionStateFlow
+            .distinctUntilChanged()
+            .debounce(350)
+    )
+        .merge()
+        .onStart { emit(UiAction.Refresh) }
+        .flatMapLatest { action ->
+            createPager(_searchState.value).flow
+        }
+        .cachedIn(viewModelScope)
+
+    fun handleLoadStates(loadStates: CombinedLoadStates, itemCount: Int) {
+        val isLoading = loadStates.refresh is LoadState.Loading
+        val isError = loadStates.refresh is LoadState.Error
+        val isEmpty = loadStates.refresh is LoadState.NotLoading && itemCount == 0
+
+        _uiState.value = when {
+            isError -> UiState.Error((loadStates.refresh as LoadState.Error).error)
+            isLoading -> UiState.Loading
+            isEmpty -> UiState.Empty
+            else -> UiState.Content
+        }
+    }
+
+    fun synchronize() {
+        viewModelScope.launch {
+            _uiState.value = UiState.SyncInProgress
+            try {
+                when (val result = interactor.synchronize()) {
+                    is SyncResult.Success -> {
+                        _uiState.value = UiState.SyncSuccess(result.updatedPrompts.size)
+                        loadPrompts(resetAll = true)
+                    }
+                    is SyncResult.Error -> {
+                        _uiState.value = UiState.SyncError
+                        _error.tryEmit(ResourceString(R.string.sync_error, result.message))
+                    }
+                    is SyncResult.Conflicts -> {
+                        _uiState.value = UiState.SyncConflicts(result.conflicts)
+                    }
+                }
+            } catch (e: Exception) {
+                handleError(e)
+                _uiState.value = UiState.SyncError
+            }
+        }
+    }
+}
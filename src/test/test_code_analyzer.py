@@ -178,4 +178,136 @@ def test_analyze_path_directory(mock_ollama_client, tmp_path):
     assert str(java_file) in results
     
     # Проверяем, что .txt файл не обработан
-    assert str(text_file) not in results 
\ No newline at end of file
+    assert str(text_file) not in results 
+
+def test_cache_path_changes_when_file_changes(mock_ollama_client, tmp_path):
+    """Тест сброса кэша при изменении файла."""
+    test_file = tmp_path / "TestClass.kt"
+    test_file.write_text("class TestClass {}")
+
+    analyzer = CodeAnalyzer(mock_ollama_client, cache_dir=str(tmp_path / ".cache"))
+    cache_path = analyzer._get_cache_path(str(test_file), "kotlin")
+
+    # Повторный запрос для неизмененного файла дает тот же путь
+    assert analyzer._get_cache_path(str(test_file), "kotlin") == cache_path
+
+    # После изменения файла путь к кэшу должен измениться
+    test_file.write_text("class TestClass { fun hello() {} }")
+    assert analyzer._get_cache_path(str(test_file), "kotlin") != cache_path
+
+
+def test_generate_documentation(mock_ollama_client, tmp_path):
+    """Тест генерации итоговой документации по результатам анализа."""
+    analyzer = CodeAnalyzer(mock_ollama_client, cache_dir=str(tmp_path / ".cache"))
+    analyzer.analysis_results = {
+        str(tmp_path / "a" / "First.kt"): {"status": "success", "documentation": "/** First */"},
+        str(tmp_path / "b" / "Broken.kt"): {"status": "error", "error": "boom"},
+    }
+
+    output_file = tmp_path / "docs" / "analysis.md"
+    analyzer.generate_documentation(str(output_file))
+
+    content = output_file.read_text(encoding="utf-8")
+    files_part, docs_part = content.split("## Документация классов")
+
+    # В списке файлов присутствуют все файлы со статусами
+    assert "- ✅ First.kt" in files_part
+    assert "- ❌ Broken.kt" in files_part
+
+    # Документация добавляется только для успешно проанализированных файлов
+    assert "#### First.kt" in docs_part
+    assert "/** First */" in docs_part
+    assert "Broken.kt" not in docs_part
+
+
+def test_find_file_in_output_dir(mock_ollama_client, tmp_path, monkeypatch):
+    """Тест поиска файла с документацией в папке output."""
+    monkeypatch.chdir(tmp_path)
+    nested_dir = tmp_path / "output" / "nested"
+    nested_dir.mkdir(parents=True)
+    (nested_dir / "Existing.kt").write_text("class Existing")
+
+    analyzer = CodeAnalyzer(mock_ollama_client, cache_dir=str(tmp_path / ".cache"))
+
+    assert analyzer.find_file_in_output_dir("Existing.kt") == str(nested_dir / "Existing.kt")
+    assert analyzer.find_file_in_output_dir("Missing.kt") is None
+
+    # Файл, сохраненный анализатором после построения индекса, тоже находится
+    source_file = tmp_path / "src" / "Saved.kt"
+    source_file.parent.mkdir()
+    source_file.write_text("class Saved {}")
+    analyzer._save_result(str(source_file), {"documentation": "/** Saved */"}, "output")
+
+    found = analyzer.find_file_in_output_dir("Saved.kt")
+    assert found is not None and os.path.exists(found)
+
+
+def test_validate_documentation(mock_ollama_client, tmp_path):
+    """Тест валидации документации, полученной от модели."""
+    analyzer = CodeAnalyzer(mock_ollama_client, cache_dir=str(tmp_path / ".cache"))
+
+    # Чистый KDoc возвращается без изменений
+    assert analyzer._validate_documentation("  /**\n * Класс\n */\n") == "/**\n * Класс\n */"
+
+    # Тройные кавычки и строки-заглушки удаляются
+    doc = analyzer._validate_documentation(
+        "```kotlin\n/**\n * [Краткое описание класса]\n * Класс\n */\n```")
+    assert doc == "/**\n * Класс\n */"
+
+    # Кавычки внутри документации удаляются, содержимое сохраняется
+    doc = analyzer._validate_documentation("/**\n * Пример: ``` val x = 1 ```\n */")
+    assert doc == "/**\n * Пример: val x = 1\n */"
+
+
+def test_find_file_in_output_dir_after_delete(mock_ollama_client, tmp_path, monkeypatch):
+    """Тест поиска в папке output после удаления файла, попавшего в индекс."""
+    monkeypatch.chdir(tmp_path)
+    first = tmp_path / "output" / "a" / "TestClass.kt"
+    first.parent.mkdir(parents=True)
+    first.write_text("class TestClass {}")
+
+    analyzer = CodeAnalyzer(mock_ollama_client)
+    assert analyzer.find_file_in_output_dir("TestClass.kt") == str(first)
+
+    # Файл перенесен в другую папку: индекс обновляется
+    second = tmp_path / "output" / "b" / "TestClass.kt"
+    second.parent.mkdir()
+    first.rename(second)
+    assert analyzer.find_file_in_output_dir("TestClass.kt") == str(second)
+
+    # Файл удален: устаревший путь не возвращается
+    second.unlink()
+    assert analyzer.find_file_in_output_dir("TestClass.kt") is None
+
+
+def test_find_file_in_output_dir_after_create(mock_ollama_client, tmp_path, monkeypatch):
+    """Тест поиска в папке output файла, созданного после первого поиска."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "output").mkdir()
+
+    analyzer = CodeAnalyzer(mock_ollama_client)
+    assert analyzer.find_file_in_output_dir("TestClass.kt") is None
+
+    # Файл появился после построения индекса: промах приводит к повторному обходу
+    created = tmp_path / "output" / "TestClass.kt"
+    created.write_text("class TestClass {}")
+    assert analyzer.find_file_in_output_dir("TestClass.kt") == str(created)
+
+
+@pytest.mark.parametrize("recursive", [True, False])
+def test_find_files_matches_glob(mock_ollama_client, tmp_path, recursive):
+    """Тест совпадения find_files с поиском через glob по каждому расширению."""
+    for name in ["b/Nested.kt", "Main.java", "a/deep/Util.kt", "Root.kt",
+                 "a/Helper.java", "Upper.KT", "notes.txt", "b/Script.kts"]:
+        file_path = tmp_path / name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text("")
+
+    analyzer = CodeAnalyzer(mock_ollama_client)
+    pattern = "**/*{}" if recursive else "*{}"
+    expected = [file for ext in analyzer.supported_extensions
+                for file in tmp_path.glob(pattern.format(ext))]
+
+    # Расширение сравнивается с учетом регистра, порядок - как у glob
+    assert analyzer.find_files(tmp_path, recursive) == expected
+    assert tmp_path / "Upper.KT" not in expected
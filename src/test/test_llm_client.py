@@ -0,0 +1,299 @@
+import asyncio
+import json
+import re
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.llm.llm_client import OllamaClient
+
+
+def make_chunks(*texts, **metrics):
+    """Части потокового ответа Ollama: метрики приходят в последней части."""
+    chunks = [{"response": text, "done": False} for text in texts]
+    chunks.append({"response": "", "done": True, **metrics})
+    return chunks
+
+
+async def async_stream(chunks):
+    """Асинхронный поток частей ответа, как у AsyncClient.generate(stream=True)."""
+    for chunk in chunks:
+        yield chunk
+
+
+def make_async_client(*texts):
+    """Мок ollama.AsyncClient, каждый запрос которого возвращает поток из texts."""
+    async_client = MagicMock()
+    async_client.generate = AsyncMock(side_effect=lambda **kwargs: async_stream(make_chunks(*texts)))
+    async_client.__aenter__.return_value = async_client
+    return async_client
+
+
+@pytest.fixture
+def mock_ollama():
+    """Фикстура для мока ollama.Client с одной моделью."""
+    mock_client = MagicMock()
+    mock_client.list.return_value = {"models": [{"model": "qwen2.5-coder:7b", "size": 1024}]}
+    mock_client.show.return_value = {"modelinfo": {
+        "general.architecture": "qwen2",
+        "qwen2.context_length": 32768,
+        "qwen2.block_count": 28,
+        "qwen2.embedding_length": 3584,
+        "qwen2.attention.head_count": 28,
+        "qwen2.attention.head_count_kv": 4,
+    }}
+    return mock_client
+
+
+@pytest.fixture
+def client(mock_ollama):
+    """Фикстура для OllamaClient поверх мока ollama.Client."""
+    return OllamaClient(client=mock_ollama)
+
+
+def test_context_size_calculation(client):
+    """Тест корректности расчета размера контекста."""
+    # Контекст с фиксированным размером
+    context = {
+        "Файл1": "A" * 100,  # 100 байт
+        "Файл2": "B" * 100  # 100 байт
+    }
+
+    # 100 // 3 = 33 токена на файл и по 20 токенов на заголовок каждого раздела
+    assert client.estimate_context_tokens(context) == 2 * 33 + 2 * 20
+    # Кириллица занимает 2 байта на символ в UTF-8
+    assert client.estimate_context_tokens({"Файл": "Я" * 30}) == 60 // 3 + 20
+    assert client.estimate_context_tokens(None) == 0
+    assert client.estimate_context_tokens({}) == 0
+
+
+def test_analyze_code_batch(client, mock_ollama):
+    """Тест пакетного анализа: документации из JSON распределяются по фрагментам."""
+    docs = ["/**\n * Класс A\n */", "/**\n * Класс B\n */"]
+    mock_ollama.generate.return_value = iter(make_chunks(
+        json.dumps({"docs": docs}), eval_count=40, eval_duration=10 ** 9))
+
+    results = client.analyze_code_batch([("class A", "kotlin"), ("  ", "kotlin"), ("class B", "kotlin")])
+
+    # Пустой фрагмент в запрос не попадает и получает ошибку
+    assert results[1] == {"error": "пустой код", "code": ""}
+    assert [results[0]["documentation"], results[2]["documentation"]] == docs
+    assert results[0]["status"] == "success"
+    assert results[0]["metrics"]["batch_size"] == 2
+
+    mock_ollama.generate.assert_called_once()
+    kwargs = mock_ollama.generate.call_args.kwargs
+    assert kwargs["format"] == "json"
+    assert "<<<ФРАГМЕНТ 2>>>" in kwargs["prompt"]
+    assert "<<<ФРАГМЕНТ 3>>>" not in kwargs["prompt"]
+
+
+def test_analyze_code_batch_all_empty(client, mock_ollama):
+    """Тест пакетного анализа только пустых фрагментов: запрос к модели не отправляется."""
+    results = client.analyze_code_batch([("", "kotlin"), (" ", "kotlin")])
+
+    assert all(result["error"] == "пустой код" for result in results)
+    mock_ollama.generate.assert_not_called()
+
+
+@pytest.mark.parametrize("response", [
+    pytest.param(json.dumps({"docs": ["/**\n * Класс A\n */"]}), id="length_mismatch"),
+    pytest.param(json.dumps({"docs": "/** */"}), id="not_a_list"),
+    pytest.param("{не JSON", id="invalid_json"),
+])
+def test_analyze_code_batch_fallback(client, mock_ollama, response):
+    """Тест перехода к отдельным запросам, если пакетный ответ не удалось разобрать."""
+    mock_ollama.generate.return_value = iter(make_chunks(response))
+    fallback = [{"documentation": "/** A */", "status": "success"},
+                {"documentation": "/** B */", "status": "success"}]
+
+    with patch.object(OllamaClient, "analyze_codes", return_value=fallback) as analyze_codes:
+        results = client.analyze_code_batch([("class A", "kotlin"), ("", "kotlin"), ("class B", "kotlin")])
+
+    analyze_codes.assert_called_once_with([("class A", "kotlin", None), ("class B", "kotlin", None)], None)
+    assert results[0] == fallback[0]
+    assert results[1]["error"] == "пустой код"
+    assert results[2] == fallback[1]
+
+
+def test_batch_request_context_fits_all_docs(client):
+    """Тест размера контекста пакетного запроса: промпт и все документации помещаются."""
+    codes = ["class A {\n" + "    val x = 1\n" * 150 + "}"] * 3
+    prompt, system_prompt, params = client._prepare_batch_request(codes, "kotlin")
+
+    assert params["num_predict"] == 3 * (client._estimate_doc_size(codes[0]) + 200)
+    input_tokens = len((system_prompt + prompt).encode()) // 3
+    assert params["num_ctx"] >= input_tokens + params["num_predict"]
+
+
+def test_batch_request_context_is_clamped(client):
+    """Тест ограничения контекста пакетного запроса безопасным пределом модели."""
+    client.context_length = 8192
+    codes = ["class A {\n" + "    val x = 1\n" * 300 + "}"] * 10
+
+    _, _, params = client._prepare_batch_request(codes, "kotlin")
+
+    assert params["num_ctx"] == int(8192 * 0.8)
+
+
+def test_batch_request_options_override(client):
+    """Тест переопределения параметров пакетного запроса."""
+    _, _, params = client._prepare_batch_request(["class A"], "kotlin", {"num_ctx": 2048, "num_predict": 10})
+
+    assert params["num_ctx"] == 2048
+    assert params["num_predict"] == 10
+
+
+def test_async_client_uses_host_and_timeout(mock_ollama):
+    """Тест асинхронного клиента: адрес и таймаут берутся из параметров конструктора."""
+    async_client = make_async_client("/**\n * Класс\n */")
+    timeout = httpx.Timeout(300.0, connect=10.0)
+    client = OllamaClient(host="http://ollama.test:12345", client=mock_ollama, timeout=timeout)
+
+    with patch("ollama.AsyncClient", return_value=async_client) as async_client_cls:
+        client.analyze_codes([("class A", "kotlin", None)])
+
+    async_client_cls.assert_called_once_with(host="http://ollama.test:12345", timeout=timeout)
+
+
+def test_analyze_codes_closes_temporary_client(client):
+    """Тест analyze_codes: временный AsyncClient общий для запросов и закрывается после них."""
+    async_client = make_async_client("/**\n * Класс\n */")
+
+    with patch("ollama.AsyncClient", return_value=async_client) as async_client_cls:
+        results = client.analyze_codes([("class A", "kotlin", None), ("class B", "kotlin", None)])
+
+    assert [result["status"] for result in results] == ["success", "success"]
+    assert async_client.generate.await_count == 2
+    async_client_cls.assert_called_once()
+    async_client.__aexit__.assert_awaited_once()
+
+
+def test_analyze_codes_uses_injected_async_client(mock_ollama):
+    """Тест analyze_codes: переданный в конструктор AsyncClient используется и не закрывается."""
+    async_client = make_async_client("/**\n * Класс\n */")
+    client = OllamaClient(client=mock_ollama, async_client=async_client)
+
+    with patch("ollama.AsyncClient") as async_client_cls:
+        results = client.analyze_codes([("class A", "kotlin", None)])
+
+    assert results[0]["status"] == "success"
+    async_client_cls.assert_not_called()
+    async_client.__aexit__.assert_not_awaited()
+
+
+def test_analyze_codes_inside_running_loop(client):
+    """Тест analyze_codes из работающего цикла событий (асинхронный код, Jupyter)."""
+    async_client = make_async_client("/**\n * Класс\n */")
+
+    async def caller():
+        return client.analyze_codes([("class A", "kotlin", None)])
+
+    with patch("ollama.AsyncClient", return_value=async_client):
+        results = asyncio.run(caller())
+
+    assert results[0]["status"] == "success"
+    async_client.__aexit__.assert_awaited_once()
+
+
+class FakeStream:
+    """Поток частей ответа с учетом прочитанных частей и закрытия, как у генератора Client.generate."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_collect_stream_merges_chunks(client):
+    """Тест сборки потокового ответа: текст объединяется, метрики берутся из последней части."""
+    stream = FakeStream(make_chunks("/**", " * Класс", " */", eval_count=3, total_duration=10))
+
+    response, time_to_first_token = client._collect_stream(stream)
+
+    assert response["response"] == "/** * Класс */"
+    assert response["eval_count"] == 3
+    assert response["total_duration"] == 10
+    assert response["prompt_eval_count"] == 0
+    assert time_to_first_token is not None
+    assert not stream.closed
+
+
+def test_collect_stream_marker_split_across_chunks(client):
+    """Тест маркера остановки, пришедшего по частям в соседних фрагментах ответа."""
+    stream = FakeStream(make_chunks("/** Внешние зави", "симости: нет */", "лишний текст", eval_count=5))
+
+    response, _ = client._collect_stream(stream, ["Внешние зависимости:", "*/"])
+
+    assert response["response"] == "/** Внешние зависимости: нет */"
+    assert stream.closed
+    assert stream.consumed == 2
+
+
+def test_collect_stream_waits_for_all_markers(client):
+    """Тест досрочной остановки: поток читается, пока не получены все маркеры."""
+    stream = FakeStream(make_chunks("/** @property */", " @constructor", " конец", eval_count=5))
+
+    response, _ = client._collect_stream(stream, ["@property", "@constructor"])
+
+    assert response["response"] == "/** @property */ @constructor"
+    assert stream.consumed == 2
+
+
+def test_collect_stream_metrics_on_early_stop(client):
+    """Тест метрик при досрочной остановке: последняя часть с метриками не получена."""
+    stream = FakeStream(make_chunks("/** */", "лишний текст", eval_count=5, eval_duration=10 ** 9))
+
+    response, _ = client._collect_stream(stream, ["*/"])
+    metrics = client._calculate_metrics(response)
+
+    assert stream.closed
+    assert all(response[key] == 0 for key in ("eval_count", "eval_duration", "total_duration"))
+    assert metrics["generation_speed"] == 0
+    assert metrics["time_per_token"] == 0
+
+
+def test_collect_stream_async(client):
+    """Тест сборки асинхронного потокового ответа."""
+    stream = async_stream(make_chunks("/**", " */", eval_count=2, eval_duration=10 ** 9))
+
+    response, time_to_first_token = asyncio.run(client._collect_stream_async(stream))
+
+    assert response["response"] == "/** */"
+    assert response["eval_count"] == 2
+    assert time_to_first_token is not None
+
+
+def test_analyze_code_batch_groups_by_file_type(client, mock_ollama):
+    """Тест пакетного анализа: фрагменты разных типов отправляются отдельными пакетами."""
+    mock_ollama.generate.side_effect = lambda **kwargs: iter(make_chunks(
+        json.dumps({"docs": ["/**\n * Класс\n */"] * len(re.findall(r"<<<ФРАГМЕНТ \d+>>>", kwargs["prompt"]))})))
+
+    with patch.object(OllamaClient, "SUPPORTED_FILE_TYPES", frozenset({"kotlin", "java"})), \
+            patch.object(OllamaClient, "_prepare_request", wraps=client._prepare_request) as prepare:
+        results = client.analyze_code_batch([("class A", "kotlin"), ("class B", "java"), ("class C", "kotlin")])
+
+    assert [result["status"] for result in results] == ["success"] * 3
+    assert [result["metrics"]["batch_size"] for result in results] == [2, 1, 2]
+    assert [call.args[1] for call in prepare.call_args_list] == ["kotlin", "java"]
+
+
+def test_analyze_code_batch_fallback_keeps_file_type(client, mock_ollama):
+    """Тест перехода к отдельным запросам: каждый фрагмент сохраняет свой тип файла."""
+    mock_ollama.generate.side_effect = lambda **kwargs: iter(make_chunks("{не JSON"))
+
+    with patch.object(OllamaClient, "SUPPORTED_FILE_TYPES", frozenset({"kotlin", "java"})), \
+            patch.object(OllamaClient, "analyze_codes", side_effect=lambda items, options: [{}] * len(items)) \
+            as analyze_codes:
+        client.analyze_code_batch([("class A", "kotlin"), ("class B", "java")])
+
+    assert [call.args[0] for call in analyze_codes.call_args_list] == [
+        [("class A", "kotlin", None)], [("class B", "java", None)]]